@@ -1,14 +1,16 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from argon2 import PasswordHasher
-from fastapi import Depends
+from fastapi import Depends, HTTPException, status
 
 import os
 import jwt
+import time
 import datetime
+from collections import OrderedDict
 from dotenv import load_dotenv
 
-from .database import get_db
+from .database import get_async_db
+from . import passwords
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -16,22 +18,97 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY not found in environment variables")
 
-def authenticate_user(username: str, password: str, db: Session = Depends(get_db)):
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Comma-separated user ids allowed to use the /api/admin routes
+ADMIN_USER_IDS = {int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+
+class TokenCache:
+    """
+    LRU cache of verified tokens. Each entry expires at its token's exp claim.
+    Revoked tokens are remembered until they expire so they are never re-verified.
+    Only touched from the event loop, so it needs no locking.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # token -> (user_id, exp)
+        self._revoked = {}             # token -> exp
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, exp = entry
+        if exp <= time.time():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user_id
+
+    def put(self, token: str, user_id: int, exp: float):
+        if self.maxsize <= 0:
+            return
+        self._entries[token] = (user_id, exp)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, token: str, exp: float):
+        """
+        Drop a token from the cache and reject it until it expires (logout / revocation).
+        """
+        self._entries.pop(token, None)
+        now = time.time()
+        self._revoked = {t: e for t, e in self._revoked.items() if e > now}
+        self._revoked[token] = exp
+
+    def is_revoked(self, token: str) -> bool:
+        exp = self._revoked.get(token)
+        return exp is not None and exp > time.time()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "revoked": len(self._revoked),
+        }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+async def authenticate_user(username: str, password: str, db: AsyncSession = Depends(get_async_db)):
     """
     Authenticate user by username and password.
     """
     query = text("SELECT user_id, username, password_hash FROM users WHERE username = :username")
-    user = db.execute(query, {"username": username}).fetchone()
+    user = (await db.execute(query, {"username": username})).fetchone()
     
     if not user:
         return False
     
-    ph = PasswordHasher()
-
-    try:
-        ph.verify(user.password_hash, password)
-    except:
+    matches, needs_rehash = await passwords.verify_password(user.password_hash, password)
+    if not matches:
         return False
+
+    # Rehash transparently when the argon2 parameters have changed
+    if needs_rehash:
+        new_hash = await passwords.hash_password(password)
+        await db.execute(
+            text("UPDATE users SET password_hash = :password_hash WHERE user_id = :user_id"),
+            {"password_hash": new_hash, "user_id": user.user_id}
+        )
+        await db.commit()
     return user
 
 def get_token(user_id: int):
@@ -49,14 +126,40 @@ def get_token(user_id: int):
     except Exception as e:
         return None
 
-def verify_token(token: str):
+async def verify_token(token: str):
     """
-    verify jwt
+    verify jwt, served from token_cache after the first successful decode
     """
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    if token_cache.is_revoked(token):
+        return None
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return payload["user_id"]
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
-        return None
\ No newline at end of file
+        return None
+    token_cache.put(token, payload["user_id"], payload["exp"])
+    return payload["user_id"]
+
+def revoke_token(token: str):
+    """
+    Invalidation hook for logout or revocation.
+    """
+    try:
+        exp = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])["exp"]
+    except jwt.InvalidTokenError:
+        return
+    token_cache.invalidate(token, exp)
+
+async def require_admin(user_id: int = Depends(verify_token)):
+    """
+    Dependency for admin-only routes.
+    """
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if user_id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return user_id
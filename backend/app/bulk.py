@@ -0,0 +1,318 @@
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import text
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+import anyio
+import asyncio
+import contextlib
+import csv
+import io
+import itertools
+import os
+
+from . import database, schemas, categories
+from .cache import response_cache
+
+# Column layout of catalogue dumps (docs/output.csv), identical to the items table.
+ITEM_COLUMNS = (
+    "item_id", "title", "description", "condition", "owner_id", "post_date",
+    "price", "exchange_type", "status", "desired_item", "category", "total_images",
+)
+REQUIRED_COLUMNS = {"title", "condition", "owner_id", "category"}
+# Optional extra import column: ';'-separated image file names, replacing the item's images
+IMAGES_COLUMN = "images"
+# item_images rows hold the URL path create_item stores, not the bare file name
+IMAGE_PATH_PREFIX = "/api/images/"
+
+# Imports stream past the normal upload limit, so they get their own body limit.
+BULK_IMPORT_MAX_BYTES = int(os.getenv("BULK_IMPORT_MAX_BYTES", str(1024 * 1024 * 1024)))
+BULK_IMPORT_MAX_ERRORS = int(os.getenv("BULK_IMPORT_MAX_ERRORS", "100"))
+# CSV rows parsed per worker-thread hop
+BULK_BATCH_ROWS = 5000
+# COPY output chunks buffered between the database and a slow client
+EXPORT_QUEUE_CHUNKS = 16
+
+_BOOLEANS = {"t": True, "true": True, "1": True, "f": False, "false": False, "0": False}
+
+# Staging table, dropped when the import transaction ends
+STAGING_TABLE = "item_import"
+_STAGING_COLUMNS = ("row_number",) + ITEM_COLUMNS + (IMAGES_COLUMN,)
+
+async def export_items() -> AsyncIterator[bytes]:
+    """
+    Stream every item as CSV straight from COPY ... TO STDOUT.
+    Memory stays bounded by EXPORT_QUEUE_CHUNKS however large the table is.
+    """
+    queue = asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+
+    async def produce():
+        try:
+            async with database.async_engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_from_table(
+                    "items", columns=list(ITEM_COLUMNS), output=queue.put, format="csv", header=True,
+                )
+        finally:
+            # the consumer may be gone; never block here
+            with contextlib.suppress(asyncio.QueueFull):
+                queue.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    try:
+        while not (queue.empty() and task.done()):
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield bytes(chunk)
+        # re-raise a failed COPY so the response is cut short instead of looking complete
+        await task
+    finally:
+        task.cancel()
+
+class _Report:
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0
+        self.errors: List[schemas.ImportRowError] = []
+        self.errors_truncated = False
+
+    def error(self, row: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < BULK_IMPORT_MAX_ERRORS:
+            self.errors.append(schemas.ImportRowError(row=row, error=message))
+        else:
+            self.errors_truncated = True
+
+def _int(value: str, column: str, required: bool = False) -> Optional[int]:
+    if value == "":
+        if required:
+            raise ValueError(f"{column}: required")
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{column}: not an integer: {value!r}")
+
+def _bool(value: str, column: str) -> Optional[bool]:
+    if value == "":
+        return None
+    try:
+        return _BOOLEANS[value.strip().lower()]
+    except KeyError:
+        raise ValueError(f"{column}: not a boolean: {value!r}")
+
+def _timestamp(value: str, column: str) -> Optional[datetime]:
+    if value == "":
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{column}: not a timestamp: {value!r}")
+
+def _text(value: str, column: str, max_length: Optional[int] = None, required: bool = False) -> Optional[str]:
+    if value == "":
+        if required:
+            raise ValueError(f"{column}: required")
+        return None
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f"{column}: longer than {max_length} characters")
+    return value
+
+def _images(value: str) -> Optional[List[str]]:
+    if value == "":
+        return None
+    paths = []
+    for name in (name.strip() for name in value.split(";")):
+        if not name:
+            continue
+        # Accept the stored path form as well as bare upload file names
+        name = name.removeprefix(IMAGE_PATH_PREFIX)
+        if "/" in name or "\\" in name or len(name) > 255:
+            raise ValueError(f"{IMAGES_COLUMN}: invalid file name: {name!r}")
+        paths.append(IMAGE_PATH_PREFIX + name)
+    return paths
+
+def _convert(row: dict) -> tuple:
+    """
+    Validate one CSV row and convert it to a staging record (without row_number).
+    Raises ValueError describing the first problem found.
+    """
+    return (
+        _int(row.get("item_id", ""), "item_id"),
+        _text(row["title"], "title", 100, required=True),
+        _text(row.get("description", ""), "description"),
+        _text(row["condition"], "condition", 50, required=True),
+        _int(row["owner_id"], "owner_id", required=True),
+        _timestamp(row.get("post_date", ""), "post_date"),
+        _int(row.get("price", ""), "price"),
+        _bool(row.get("exchange_type", ""), "exchange_type"),
+        _bool(row.get("status", ""), "status"),
+        _text(row.get("desired_item", ""), "desired_item", 100),
+        _int(row["category"], "category", required=True),
+        _int(row.get("total_images", ""), "total_images"),
+        _images(row.get(IMAGES_COLUMN, "")),
+    )
+
+def _read_batch(reader, size: int) -> list:
+    return list(itertools.islice(reader, size))
+
+async def _staged_records(reader: csv.DictReader, report: _Report):
+    while batch := await anyio.to_thread.run_sync(_read_batch, reader, BULK_BATCH_ROWS):
+        for row in batch:
+            report.rows += 1
+            if None in row or None in row.values():
+                report.error(report.rows, "wrong number of fields")
+                continue
+            try:
+                yield (report.rows,) + _convert(row)
+            except ValueError as e:
+                report.error(report.rows, str(e))
+
+async def _report_deleted(conn, statement: str, report: _Report, message: str):
+    result = await conn.stream(text(statement))
+    async for row in result:
+        report.error(row.row_number, message.format(**row._mapping))
+
+async def import_items(upload: UploadFile, strict: bool = False) -> schemas.ImportReport:
+    """
+    Load a catalogue CSV: validate rows while streaming them into a staging table with
+    COPY FROM STDIN, then merge into items (and item_images) in one transaction.
+    Existing item_ids are updated, rows without one are inserted. An update only
+    overwrites the columns present in the file, and recounts total_images from the
+    item's images. Invalid rows are skipped and reported; with strict=True any invalid
+    row aborts the import.
+    """
+    stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(stream)
+    try:
+        header = await anyio.to_thread.run_sync(lambda: reader.fieldnames)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unreadable CSV: {e}")
+    if not header:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty CSV")
+    missing = REQUIRED_COLUMNS - set(header)
+    unknown = set(header) - set(ITEM_COLUMNS) - {IMAGES_COLUMN}
+    if missing or unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Bad CSV header; missing: {sorted(missing)}, unknown: {sorted(unknown)}",
+        )
+
+    report = _Report()
+    async with database.async_engine.begin() as conn:
+        await conn.execute(text(f"""
+            CREATE TEMP TABLE {STAGING_TABLE} (
+                row_number INTEGER NOT NULL,
+                item_id INTEGER,
+                title VARCHAR(100) NOT NULL,
+                description TEXT,
+                condition VARCHAR(50) NOT NULL,
+                owner_id INTEGER NOT NULL,
+                post_date TIMESTAMP WITH TIME ZONE,
+                price INTEGER,
+                exchange_type BOOLEAN,
+                status BOOLEAN,
+                desired_item VARCHAR(100),
+                category INTEGER NOT NULL,
+                total_images INTEGER,
+                images VARCHAR(255)[],
+                existed BOOLEAN
+            ) ON COMMIT DROP
+        """))
+        raw = await conn.get_raw_connection()
+        try:
+            await raw.driver_connection.copy_records_to_table(
+                STAGING_TABLE, columns=list(_STAGING_COLUMNS), records=_staged_records(reader, report),
+            )
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unreadable CSV at row {report.rows + 1}: {e}")
+
+        # Later rows win when the file repeats an item_id
+        await _report_deleted(conn, f"""
+            DELETE FROM {STAGING_TABLE} a USING {STAGING_TABLE} b
+            WHERE a.item_id = b.item_id AND a.row_number < b.row_number
+            RETURNING a.row_number, a.item_id
+        """, report, "duplicate item_id {item_id}, superseded by a later row")
+        await _report_deleted(conn, f"""
+            DELETE FROM {STAGING_TABLE} s
+            WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = s.owner_id)
+            RETURNING s.row_number, s.owner_id
+        """, report, "owner_id {owner_id} does not exist")
+
+        if strict and report.skipped:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=_finish(report, 0, 0).model_dump())
+
+        # Same placeholder categories create_item makes for unknown ids
+        await conn.execute(text(f"""
+            INSERT INTO categories (category_id, category_name)
+            SELECT DISTINCT s.category, 'Category ' || s.category
+            FROM {STAGING_TABLE} s
+            WHERE NOT EXISTS (SELECT 1 FROM categories c WHERE c.category_id = s.category)
+        """))
+        await conn.execute(text(f"""
+            UPDATE {STAGING_TABLE} SET item_id = nextval(pg_get_serial_sequence('items', 'item_id'))
+            WHERE item_id IS NULL
+        """))
+        # Existing rows only take the columns present in the file; the defaults below apply to new rows
+        update_columns = [c for c in ITEM_COLUMNS if c in header and c not in ("item_id", "total_images")]
+        counts = (await conn.execute(text(f"""
+            WITH upserted AS (
+                INSERT INTO items (item_id, title, description, condition, owner_id, post_date,
+                                   price, exchange_type, status, desired_item, category, total_images)
+                SELECT item_id, title, description, condition, owner_id, COALESCE(post_date, now()),
+                       price, COALESCE(exchange_type, false), COALESCE(status, true), desired_item, category,
+                       COALESCE(cardinality(images), total_images, 0)
+                FROM {STAGING_TABLE}
+                ORDER BY item_id
+                ON CONFLICT (item_id) DO UPDATE SET
+                    {", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)}
+                RETURNING item_id, (xmax = 0) AS inserted
+            ), marked AS (
+                UPDATE {STAGING_TABLE} s SET existed = NOT u.inserted
+                FROM upserted u WHERE s.item_id = u.item_id
+            )
+            SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated
+            FROM upserted
+        """))).fetchone()
+
+        if IMAGES_COLUMN in header:
+            await conn.execute(text(f"""
+                DELETE FROM item_images ii USING {STAGING_TABLE} s
+                WHERE s.images IS NOT NULL AND ii.item_id = s.item_id
+            """))
+            await conn.execute(text(f"""
+                INSERT INTO item_images (item_id, image_data_name)
+                SELECT s.item_id, img.name
+                FROM {STAGING_TABLE} s
+                CROSS JOIN LATERAL unnest(s.images) WITH ORDINALITY AS img(name, position)
+                WHERE s.images IS NOT NULL
+                ORDER BY s.item_id, img.position
+            """))
+
+        # total_images of an updated item always matches its item_images rows, kept or replaced
+        await conn.execute(text(f"""
+            UPDATE items i SET total_images = (SELECT count(*) FROM item_images ii WHERE ii.item_id = i.item_id)
+            FROM {STAGING_TABLE} s
+            WHERE s.item_id = i.item_id AND s.existed
+        """))
+
+        # Explicit item_ids bypass the sequence; move it past them (never backwards)
+        await conn.execute(text("""
+            SELECT setval(seq, GREATEST((SELECT MAX(item_id) FROM items), nextval(seq)))
+            FROM pg_get_serial_sequence('items', 'item_id') AS seq
+        """))
+
+    await response_cache.clear()
+    # The import may have created placeholder categories
+    categories.catalogue.invalidate()
+    return _finish(report, counts.inserted, counts.updated)
+
+def _finish(report: _Report, inserted: int, updated: int) -> schemas.ImportReport:
+    return schemas.ImportReport(
+        rows=report.rows,
+        inserted=inserted,
+        updated=updated,
+        skipped=report.skipped,
+        errors=sorted(report.errors, key=lambda e: e.row),
+        errors_truncated=report.errors_truncated,
+    )
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from typing import Optional
+import os
+import time
+
+# Read-through cache for serialized item responses.
+# RESPONSE_CACHE_BACKEND=memory (default) keeps entries in this process;
+# RESPONSE_CACHE_BACKEND=redis shares them between workers (requires the redis package).
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+
+class MemoryBackend:
+    """
+    Size-bounded LRU with a TTL per entry. Only touched from the event loop.
+    """
+    name = "memory"
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class RedisBackend:
+    """
+    Shared backend for multi-worker deployments; Redis handles TTL and eviction (maxmemory-policy).
+    """
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "dbp:response:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.from_url(url)
+        self._prefix = prefix
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._client.set(self._prefix + key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._client.delete(*(self._prefix + k for k in keys))
+
+    async def clear(self):
+        async for key in self._client.scan_iter(match=self._prefix + "*", count=1000):
+            await self._client.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+class ResponseCache:
+    """
+    Read-through cache front end with hit/miss counters.
+    Writers call invalidate() with the keys they affect after committing.
+    """
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await self.backend.set(key, value, self.ttl if ttl is None else ttl)
+
+    async def invalidate(self, *keys: str):
+        self.invalidations += len(keys)
+        await self.backend.delete(*keys)
+
+    async def clear(self):
+        """
+        Drop every entry, for bulk writes that touch too many keys to list.
+        """
+        self.invalidations += 1
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "size": self.backend.size(),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+        }
+
+def _build_backend():
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return RedisBackend(RESPONSE_CACHE_URL)
+    if RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryBackend(RESPONSE_CACHE_SIZE)
+    raise ValueError("RESPONSE_CACHE_BACKEND must be 'memory' or 'redis'")
+
+response_cache = ResponseCache(_build_backend(), RESPONSE_CACHE_TTL)
+
+# Cache keys
+ITEM_LISTING_KEY = "items:default"
+ITEM_LISTING_SUMMARY_KEY = "items:default:summary"
+ITEM_LISTING_KEYS = (ITEM_LISTING_KEY, ITEM_LISTING_SUMMARY_KEY)
+
+def item_key(item_id: int) -> str:
+    return f"item:{item_id}"
+
+def item_keys(item_id: int) -> tuple:
+    """
+    Every key affected by a write to one item: its detail and the default listing pages.
+    """
+    return (item_key(item_id), *ITEM_LISTING_KEYS)
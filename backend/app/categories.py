@@ -0,0 +1,66 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from typing import Dict, Optional
+import os
+import time
+
+# In-process category catalogue, so create_item can validate a category without a query.
+# Categories change rarely; other workers' writes are picked up on a miss or after the TTL.
+CATEGORY_CACHE_TTL = float(os.getenv("CATEGORY_CACHE_TTL", "300"))
+
+class CategoryCatalogue:
+    """
+    Category id -> name, loaded from the database as a whole. A lookup miss reloads it
+    before concluding the category does not exist, and writing a category marks it stale.
+    Only touched from the event loop, so it needs no locking.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._names: Dict[int, str] = {}
+        self._loaded_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def reload(self, db: AsyncSession):
+        rows = (await db.execute(text("SELECT category_id, category_name FROM categories"))).fetchall()
+        self._names = {row.category_id: row.category_name for row in rows}
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+
+    async def ensure(self, db: AsyncSession, category_id: int):
+        """
+        Make sure the category exists, creating a placeholder in the caller's transaction
+        if it does not. Costs no query when the category is already known.
+        """
+        if self._fresh() and category_id in self._names:
+            self.hits += 1
+            return
+        self.misses += 1
+        await self.reload(db)
+        if category_id in self._names:
+            return
+        await db.execute(text("""
+            INSERT INTO categories (category_id, category_name) VALUES (:category, :name)
+            ON CONFLICT (category_id) DO NOTHING
+        """), {"category": category_id, "name": f"Category {category_id}"})
+        # Not cached until the next reload: the caller's transaction may still roll back
+        self.invalidate()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._names),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+catalogue = CategoryCatalogue(CATEGORY_CACHE_TTL)
@@ -2,10 +2,12 @@ import os
 import time
 from pathlib import Path
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import OperationalError
-from . import models
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from . import migrations
 
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
@@ -28,23 +30,101 @@ DB_PORT = os.getenv("POSTGRES_PORT")
 if not DB_PORT:
     DB_PORT = "5432" if RUNNING_IN_DOCKER else "5433"
 
+# Connection pool settings (applied to both the sync and the async engine)
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", "5"))
+POSTGRES_MAX_OVERFLOW = int(os.getenv("POSTGRES_MAX_OVERFLOW", "10"))
+POSTGRES_POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "30"))
+POSTGRES_POOL_RECYCLE = int(os.getenv("POSTGRES_POOL_RECYCLE", "1800"))
+POSTGRES_POOL_PRE_PING = os.getenv("POSTGRES_POOL_PRE_PING", "true").lower() == "true"
+
 DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{POSTGRES_DB}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{POSTGRES_DB}"
+
+class PoolStats:
+    """
+    Checkout counters for one connection pool.
+    """
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited: float, timed_out: bool):
+        self.checkouts += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        if timed_out:
+            self.timeouts += 1
+
+class _InstrumentedPoolMixin:
+    # Stats live on the class, not the instance: the engine recreates its pool on dispose/invalidate.
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.stats.record(time.perf_counter() - start, timed_out)
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    stats = PoolStats()
 
-engine = create_engine(DATABASE_URL)
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+POOL_OPTIONS = {
+    "pool_size": POSTGRES_POOL_SIZE,
+    "max_overflow": POSTGRES_MAX_OVERFLOW,
+    "pool_timeout": POSTGRES_POOL_TIMEOUT,
+    "pool_recycle": POSTGRES_POOL_RECYCLE,
+    "pool_pre_ping": POSTGRES_POOL_PRE_PING,
+}
+
+# Sync engine: used for startup tasks (init_db) and get_db
+engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: used by the API routes so requests never hold a worker thread on I/O
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncQueuePool, **POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+def pool_status():
+    """
+    Live statistics for both connection pools.
+    """
+    status = {}
+    for name, eng in (("sync", engine), ("async", async_engine.sync_engine)):
+        pool = eng.pool
+        stats = pool.stats
+        status[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": POSTGRES_MAX_OVERFLOW,
+            "checkouts": stats.checkouts,
+            "checkout_timeouts": stats.timeouts,
+            "wait_seconds_total": round(stats.wait_seconds_total, 6),
+            "wait_seconds_max": round(stats.wait_seconds_max, 6),
+            "wait_seconds_avg": round(stats.wait_seconds_total / stats.checkouts, 6) if stats.checkouts else 0.0,
+        }
+    return status
+
 def init_db():
     """
-    initialize the database tables with retries.
+    initialize the database tables with retries, applying any pending migrations.
     """
     retries = 5
     while retries > 0:
         try:
             print(f"Connecting to {DB_HOST}:{DB_PORT} to initialize database tables...")
-            with engine.connect() as connection:
-                for statement in models.CREATE_TABLE_STATEMENTS:
-                    connection.execute(text(statement))
-                connection.commit()
+            migrations.migrate(engine)
             print("Database tables initialized.")
             break
         except OperationalError as e:
@@ -62,3 +142,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,107 @@
+# Filters and facet counts for the item listing.
+# All facets come from one GROUPING SETS aggregate over the rows matching the
+# current filters, so a page with facets costs a single extra query.
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from typing import List, Optional
+
+from . import schemas
+
+# Lower bounds of the price buckets after the first (which starts at 0).
+# Prices are compared as COALESCE(price, 0), the same key as the price sorts.
+PRICE_BUCKET_BOUNDS = [100, 500, 1000, 5000]
+PRICE_KEY = "COALESCE(i.price, 0)"
+
+FACET_QUERY = f"""
+    WITH matched AS (
+        SELECT i.category, i.condition, COALESCE(i.exchange_type, false) AS exchange_type,
+               width_bucket({PRICE_KEY}, ARRAY{PRICE_BUCKET_BOUNDS}) AS price_bucket
+        FROM items i
+        WHERE {{where}}
+    ), counts AS (
+        SELECT CASE
+                   WHEN GROUPING(category) = 0 THEN 'category'
+                   WHEN GROUPING(condition) = 0 THEN 'condition'
+                   WHEN GROUPING(exchange_type) = 0 THEN 'exchange_type'
+                   WHEN GROUPING(price_bucket) = 0 THEN 'price'
+                   ELSE 'total'
+               END AS facet,
+               category, condition, exchange_type, price_bucket, count(*) AS n
+        FROM matched
+        GROUP BY GROUPING SETS ((category), (condition), (exchange_type), (price_bucket), ())
+    )
+    SELECT counts.*, c.category_name
+    FROM counts
+    LEFT JOIN categories c ON counts.facet = 'category' AND c.category_id = counts.category
+"""
+
+def filter_clause(
+    params: dict,
+    category: Optional[List[int]] = None,
+    condition: Optional[List[str]] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    exchange_type: Optional[bool] = None,
+) -> str:
+    """
+    Return the WHERE conditions (joined with AND, empty if none) for the given filters,
+    adding their bind parameters to params.
+    """
+    conditions = []
+    if category:
+        conditions.append("i.category = ANY(:categories)")
+        params["categories"] = list(category)
+    if condition:
+        conditions.append("i.condition = ANY(:conditions)")
+        params["conditions"] = list(condition)
+    if min_price is not None:
+        conditions.append(f"{PRICE_KEY} >= :min_price")
+        params["min_price"] = min_price
+    if max_price is not None:
+        conditions.append(f"{PRICE_KEY} <= :max_price")
+        params["max_price"] = max_price
+    if exchange_type is not None:
+        conditions.append("COALESCE(i.exchange_type, false) = :exchange_type")
+        params["exchange_type"] = exchange_type
+    return " AND ".join(conditions)
+
+def _price_buckets(counts: dict) -> List[schemas.PriceBucket]:
+    bounds = [0] + PRICE_BUCKET_BOUNDS
+    return [
+        schemas.PriceBucket(
+            min_price=low,
+            max_price=bounds[n + 1] - 1 if n + 1 < len(bounds) else None,
+            count=counts.get(n, 0),
+        )
+        for n, low in enumerate(bounds)
+    ]
+
+def _by_count(facet: schemas.FacetCount):
+    return (-facet.count, str(facet.value))
+
+async def facet_counts(db: AsyncSession, where: str, params: dict) -> schemas.ItemFacets:
+    """
+    Count the items matching `where` per category, condition, exchange type and price bucket.
+    """
+    rows = (await db.execute(text(FACET_QUERY.format(where=where)), params)).fetchall()
+    total = 0
+    categories, conditions, exchange_types, prices = [], [], [], {}
+    for row in rows:
+        if row.facet == "total":
+            total = row.n
+        elif row.facet == "category":
+            categories.append(schemas.FacetCount(value=row.category, label=row.category_name, count=row.n))
+        elif row.facet == "condition":
+            conditions.append(schemas.FacetCount(value=row.condition, count=row.n))
+        elif row.facet == "exchange_type":
+            exchange_types.append(schemas.FacetCount(value=row.exchange_type, count=row.n))
+        elif row.facet == "price":
+            # width_bucket: 0 below the first bound, n for [bounds[n-1], bounds[n])
+            prices[row.price_bucket] = row.n
+    return schemas.ItemFacets(
+        total=total,
+        category=sorted(categories, key=_by_count),
+        condition=sorted(conditions, key=_by_count),
+        exchange_type=sorted(exchange_types, key=_by_count),
+        price=_price_buckets(prices),
+    )
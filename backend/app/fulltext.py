@@ -0,0 +1,28 @@
+# Item search backed by the items.search_vector GIN index (word matches)
+# and pg_trgm GIN indexes on title/description (substring and CJK matches).
+# The 'simple' config is used because most titles are Chinese, which no
+# stemming dictionary would split; trigram matching covers those.
+
+TSQUERY = "websearch_to_tsquery('simple', :search)"
+
+SEARCH_CONDITION = f"""(
+    i.search_vector @@ {TSQUERY}
+    OR i.title ILIKE :search_pattern
+    OR i.description ILIKE :search_pattern
+)"""
+
+# Relevance: full-text rank plus title trigram similarity.
+# Cast to float8 so the value survives a round trip through a cursor unchanged.
+SEARCH_RANK = f"(ts_rank(i.search_vector, {TSQUERY}) + similarity(i.title, :search))::float8"
+
+def escape_like(term: str) -> str:
+    """
+    Escape LIKE wildcards so user input is matched literally.
+    """
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_params(term: str) -> dict:
+    """
+    Bind parameters used by SEARCH_CONDITION and SEARCH_RANK.
+    """
+    return {"search": term, "search_pattern": f"%{escape_like(term)}%"}
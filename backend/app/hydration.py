@@ -0,0 +1,133 @@
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from typing import Dict, List, Optional, Tuple
+
+# Item columns plus every image path aggregated in the same round trip.
+# The LATERAL subquery runs once per returned row through ix_item_images_item_id,
+# so it composes with any WHERE / ORDER BY / LIMIT appended by the caller.
+IMAGES_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT array_agg(image_data_name ORDER BY image_id) AS images
+        FROM item_images
+        WHERE item_id = i.item_id
+    ) img ON true
+"""
+# First image only, for list views that show a single thumbnail
+FIRST_IMAGE_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT image_data_name AS image
+        FROM item_images
+        WHERE item_id = i.item_id
+        ORDER BY image_id
+        LIMIT 1
+    ) first_img ON true
+"""
+
+# Select-list expression of every field an item representation can carry.
+# "image" is not part of ItemResponse; it is the summary's replacement for "images".
+ITEM_FIELD_SQL = {
+    "item_id": "i.item_id",
+    "title": "i.title",
+    "description": "i.description",
+    "condition": "i.condition",
+    "owner_id": "i.owner_id",
+    "post_date": "i.post_date",
+    "price": "i.price",
+    "exchange_type": "i.exchange_type",
+    "status": "i.status",
+    "desired_item": "i.desired_item",
+    "total_images": "i.total_images",
+    "category": "i.category",
+    "images": "COALESCE(img.images, ARRAY[]::varchar[]) AS images",
+    "image": "first_img.image",
+}
+FULL_FIELDS = tuple(f for f in ITEM_FIELD_SQL if f != "image")
+SUMMARY_FIELDS = ("item_id", "title", "price", "status", "owner_id", "image")
+
+ITEM_SELECT = f"""
+    SELECT {", ".join(ITEM_FIELD_SQL[f] for f in FULL_FIELDS)}{{extra_columns}}
+    FROM items i
+    {IMAGES_JOIN}
+"""
+
+def resolve_fields(view: str = "full", fields: Optional[str] = None) -> Optional[Tuple[str, ...]]:
+    """
+    Fields to return for a `view` / comma-separated `fields` request, or None for the
+    full ItemResponse. item_id is always included; unknown names raise 400.
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in ITEM_FIELD_SQL]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown item fields: {', '.join(unknown)}")
+        return tuple(dict.fromkeys(["item_id", *names]))
+    if view == "summary":
+        return SUMMARY_FIELDS
+    return None
+
+def item_select(fields: Optional[Tuple[str, ...]] = None, extra_columns: str = "") -> str:
+    """
+    SELECT ... FROM items i for the given fields (all of ItemResponse when None),
+    joining item_images only for the image fields that were asked for.
+    """
+    extra = f", {extra_columns}" if extra_columns else ""
+    if fields is None:
+        return ITEM_SELECT.format(extra_columns=extra)
+    joins = (IMAGES_JOIN if "images" in fields else "") + (FIRST_IMAGE_JOIN if "image" in fields else "")
+    return f"""
+    SELECT {", ".join(ITEM_FIELD_SQL[f] for f in fields)}{extra}
+    FROM items i
+    {joins}
+"""
+
+def item_dict(row, images: Optional[list] = None, fields: Optional[Tuple[str, ...]] = None) -> dict:
+    """
+    Map a row selected with item_select (or any row with the items columns, given
+    `images`) to the ItemResponse shape, or to just `fields`, as a plain dict. Responses
+    built from these skip pydantic validation and are serialized straight to JSON by orjson.
+    """
+    if fields is not None:
+        item = {f: getattr(row, f) for f in fields}
+        if "images" in item:
+            item["images"] = list(item["images"])
+        return item
+    return {
+        "item_id": row.item_id, "title": row.title, "description": row.description,
+        "condition": row.condition, "owner_id": row.owner_id, "post_date": row.post_date,
+        "price": row.price, "exchange_type": row.exchange_type, "status": row.status,
+        "desired_item": row.desired_item, "total_images": row.total_images,
+        "category": row.category, "images": list(row.images if images is None else images),
+    }
+
+async def query_item_rows(db: AsyncSession, where: str = "", order_by: str = "", params: Optional[dict] = None, limit: Optional[int] = None, extra_columns: str = "", fields: Optional[Tuple[str, ...]] = None):
+    """
+    Run item_select with the given WHERE / ORDER BY / LIMIT clauses and return the raw rows.
+    extra_columns is appended to the select list (e.g. a computed sort key).
+    """
+    sql_str = item_select(fields, extra_columns)
+    params = dict(params or {})
+    if where:
+        sql_str += f" WHERE {where}"
+    if order_by:
+        sql_str += f" ORDER BY {order_by}"
+    if limit is not None:
+        sql_str += " LIMIT :limit"
+        params["limit"] = limit
+    return (await db.execute(text(sql_str), params)).fetchall()
+
+async def query_items(db: AsyncSession, where: str = "", order_by: str = "", params: Optional[dict] = None, limit: Optional[int] = None, fields: Optional[Tuple[str, ...]] = None) -> List[dict]:
+    """
+    Run item_select with the given clauses and hydrate every row in one pass.
+    """
+    return [item_dict(r, fields=fields) for r in await query_item_rows(db, where, order_by, params, limit, fields=fields)]
+
+async def load_items(db: AsyncSession, item_ids, fields: Optional[Tuple[str, ...]] = None) -> Dict[int, dict]:
+    """
+    Hydrate a set of items by id with a single query, keyed by item_id.
+    """
+    ids = list({i for i in item_ids if i is not None})
+    if not ids:
+        return {}
+    items = await query_items(db, where="i.item_id = ANY(:item_ids)", params={"item_ids": ids}, fields=fields)
+    return {item["item_id"]: item for item in items}
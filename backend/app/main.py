@@ -1,9 +1,10 @@
 from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
 from . import database
-from . import models, routes
+from . import models, routes, uploads, thumbnails, passwords, auth, cache, realtime, bulk, metrics, sqlstats, categories
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 # Lifespan event to initialize the database on startup
 @asynccontextmanager
@@ -13,14 +14,28 @@ async def lifespan(app: FastAPI):
         print("successfully initialized the database.")
     except Exception as e:
         print(f"Failed to initialize the database: {e}")
+
+    thumbnails.start()
+    passwords.start()
+    await realtime.broker.start()
     
     yield
 
+    await realtime.broker.shutdown()
+    passwords.shutdown()
+    thumbnails.shutdown()
+    await database.async_engine.dispose()
+
 app = FastAPI(
     title="DB Project API",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson for every JSON response; hot routes also return ORJSONResponse directly to skip response_model re-validation
+    default_response_class=ORJSONResponse,
 )
 
+# Reject oversized upload bodies while they stream in
+app.add_middleware(uploads.UploadLimitMiddleware, path_limits={"/api/admin/items/import": bulk.BULK_IMPORT_MAX_BYTES})
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -30,18 +45,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request query count and DB time, reported in Server-Timing
+app.add_middleware(sqlstats.SQLStatsMiddleware)
+
+# Outermost, so latency covers every other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Mount application routes
 app.include_router(routes.router, prefix="/api")
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the DB Project API"}
 
 @app.get("/healthcheck")
-def health_check(db: Session = Depends(database.get_db)):
+async def health_check(db: AsyncSession = Depends(database.get_async_db)):
     try:
         from sqlalchemy import text
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {
             "status": "ok"
         }
@@ -50,3 +71,23 @@ def health_check(db: Session = Depends(database.get_db)):
             status_code=500, 
             detail=f"Database connection failed: {str(e)}"
         )
+
+@app.get("/healthcheck/pool")
+async def pool_check():
+    return database.pool_status()
+
+@app.get("/healthcheck/cache")
+async def cache_check():
+    return {
+        "token_cache": auth.token_cache.stats(),
+        "response_cache": cache.response_cache.stats(),
+        "category_cache": categories.catalogue.stats(),
+    }
+
+@app.get("/healthcheck/realtime")
+async def realtime_check():
+    return realtime.broker.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return metrics.metrics_response()
@@ -0,0 +1,144 @@
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.routing import Match
+from fastapi import Response
+import os
+import time
+
+from . import database
+
+# With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory shared
+# by the workers so /metrics aggregates all of them (see the prometheus_client docs).
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Requests that match no route share one label value, so scanners cannot explode cardinality
+UNMATCHED_ROUTE = "<unmatched>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status code.",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.",
+    ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being handled.",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+REQUEST_SIZE = Histogram(
+    "http_request_size_bytes", "Request body size.",
+    ["method", "route"], buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size.",
+    ["method", "route"], buckets=SIZE_BUCKETS,
+)
+
+def route_template(scope) -> str:
+    """
+    Path template of the route a request will be dispatched to, e.g. /api/items/{item_id}.
+    """
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            # path matches but the method does not (405)
+            partial = route.path
+    return partial or UNMATCHED_ROUTE
+
+class MetricsMiddleware:
+    """
+    Record per-route latency, in-flight requests, status codes and body sizes.
+    Pure ASGI so streaming and file responses are measured to their last byte.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = route_template(scope)
+        status_code = 500
+        request_bytes = 0
+        response_bytes = 0
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            in_progress.dec()
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_SIZE.labels(method, route).observe(request_bytes)
+            RESPONSE_SIZE.labels(method, route).observe(response_bytes)
+
+class PoolCollector:
+    """
+    Connection pool gauges, read from database.pool_status() at scrape time.
+    """
+    def collect(self):
+        status = database.pool_status()
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size.", labels=["pool"]),
+            "checked_out": GaugeMetricFamily("db_pool_checked_out", "Connections currently checked out.", labels=["pool"]),
+            "checked_in": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool.", labels=["pool"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections open beyond pool_size.", labels=["pool"]),
+        }
+        checkouts = CounterMetricFamily("db_pool_checkouts", "Connection checkouts.", labels=["pool"])
+        timeouts = CounterMetricFamily("db_pool_checkout_timeouts", "Checkouts that timed out waiting for a connection.", labels=["pool"])
+        wait = CounterMetricFamily("db_pool_checkout_wait_seconds", "Total time spent waiting for a connection.", labels=["pool"])
+        for pool, stats in status.items():
+            for key, gauge in gauges.items():
+                gauge.add_metric([pool], stats[key])
+            checkouts.add_metric([pool], stats["checkouts"])
+            timeouts.add_metric([pool], stats["checkout_timeouts"])
+            wait.add_metric([pool], stats["wait_seconds_total"])
+        yield from gauges.values()
+        yield checkouts
+        yield timeouts
+        yield wait
+
+_pool_collector = PoolCollector()
+REGISTRY.register(_pool_collector)
+
+def metrics_response() -> Response:
+    """
+    Exposition for GET /metrics.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        # pool gauges are per process; this reports the worker serving the scrape
+        registry.register(_pool_collector)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,224 @@
+from sqlalchemy import text
+import re
+
+from . import models
+
+# Session-level advisory lock so only one worker applies migrations at a time
+MIGRATION_LOCK_KEY = 71_305_001
+
+CREATE_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+    );
+"""
+
+_INDEX_NAME = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+class Migration:
+    """
+    One schema version. Statements of a regular migration run in a single transaction;
+    a concurrent migration runs each statement on its own in autocommit mode, as
+    CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block.
+    """
+    def __init__(self, version: int, description: str, statements: list, concurrent: bool = False):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.concurrent = concurrent
+
+# Append new versions at the end; never edit one that has shipped.
+MIGRATIONS = [
+    # Everything init_db used to replay on each startup. It is idempotent, so databases
+    # created before versioning simply record it as applied.
+    Migration(1, "baseline schema", models.CREATE_TABLE_STATEMENTS),
+    Migration(2, "indexes for item listing, wishlist and message threads", [
+        # read_items: active items newest first / by price, item_id as the keyset tiebreaker
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_items_active_post_date ON items (post_date, item_id)
+            WHERE status = true;
+        """,
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_items_active_price ON items ((COALESCE(price, 0)), item_id)
+            WHERE status = true;
+        """,
+        # One row per (user, item); keep the earliest of any duplicates before enforcing it
+        """
+        DELETE FROM wishlist w USING wishlist d
+        WHERE w.user_id = d.user_id AND w.item_id = d.item_id AND w.wishlist_id > d.wishlist_id;
+        """,
+        """
+        CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_wishlist_user_item ON wishlist (user_id, item_id);
+        """,
+        # Covered by the leading column of ux_wishlist_user_item
+        """
+        DROP INDEX CONCURRENTLY IF EXISTS ix_wishlist_user_id;
+        """,
+        # Conversation threads: both directions of a user pair share one key range, ordered by time
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_pair_sent_at ON messages
+            (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), sent_at, message_id);
+        """,
+    ], concurrent=True),
+    Migration(3, "transaction status constraint and one pending transaction per buyer and item", [
+        # Keep the oldest of duplicate pending requests so the unique index can be built
+        """
+        UPDATE transactions t SET status = 'cancelled'
+        FROM transactions d
+        WHERE t.item_id = d.item_id AND t.buyer_id = d.buyer_id
+          AND t.status = 'pending' AND d.status = 'pending' AND t.transaction_id > d.transaction_id;
+        """,
+        """
+        CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_transactions_pending_item_buyer
+            ON transactions (item_id, buyer_id) WHERE status = 'pending';
+        """,
+        # NOT VALID: enforced for new writes without scanning (or rejecting) existing rows
+        """
+        DO $$ BEGIN
+            ALTER TABLE transactions ADD CONSTRAINT ck_transactions_status
+                CHECK (status IN ('pending', 'completed', 'cancelled')) NOT VALID;
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$;
+        """,
+    ], concurrent=True),
+    Migration(4, "active item count per category, maintained by triggers", [
+        """
+        ALTER TABLE categories ADD COLUMN IF NOT EXISTS active_item_count INTEGER NOT NULL DEFAULT 0;
+        """,
+        # Statement-level triggers with transition tables: a bulk import adjusts each
+        # category once per statement instead of once per row.
+        """
+        CREATE OR REPLACE FUNCTION items_category_count() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE categories c SET active_item_count = c.active_item_count + d.n
+                FROM (SELECT category, count(*) AS n FROM new_rows WHERE status GROUP BY category) d
+                WHERE c.category_id = d.category;
+            ELSIF TG_OP = 'DELETE' THEN
+                UPDATE categories c SET active_item_count = c.active_item_count - d.n
+                FROM (SELECT category, count(*) AS n FROM old_rows WHERE status GROUP BY category) d
+                WHERE c.category_id = d.category;
+            ELSE
+                UPDATE categories c SET active_item_count = c.active_item_count + d.n
+                FROM (
+                    SELECT category, sum(n) AS n
+                    FROM (
+                        SELECT category, 1 AS n FROM new_rows WHERE status
+                        UNION ALL
+                        SELECT category, -1 AS n FROM old_rows WHERE status
+                    ) changes
+                    GROUP BY category
+                    HAVING sum(n) <> 0
+                ) d
+                WHERE c.category_id = d.category;
+            END IF;
+            RETURN NULL;
+        END $$;
+        """,
+        # A trigger with transition tables can only handle one event
+        """
+        DROP TRIGGER IF EXISTS trg_items_category_count_insert ON items;
+        CREATE TRIGGER trg_items_category_count_insert AFTER INSERT ON items
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION items_category_count();
+        """,
+        """
+        DROP TRIGGER IF EXISTS trg_items_category_count_update ON items;
+        CREATE TRIGGER trg_items_category_count_update AFTER UPDATE ON items
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION items_category_count();
+        """,
+        """
+        DROP TRIGGER IF EXISTS trg_items_category_count_delete ON items;
+        CREATE TRIGGER trg_items_category_count_delete AFTER DELETE ON items
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION items_category_count();
+        """,
+        # CREATE TRIGGER holds off item writes until this transaction commits, so the
+        # backfill and the triggers cannot miss or double count a row
+        """
+        UPDATE categories c SET active_item_count = COALESCE(
+            (SELECT count(*) FROM items i WHERE i.category = c.category_id AND i.status), 0
+        );
+        """,
+    ]),
+    # Belongs with migration 2, which had already been applied when this was noticed
+    Migration(5, "drop item indexes superseded by the active listing indexes", [
+        # Listings sort and filter on ix_items_active_post_date / ix_items_active_price;
+        # nothing else orders or ranges on the bare columns
+        """
+        DROP INDEX CONCURRENTLY IF EXISTS ix_items_post_date;
+        """,
+        """
+        DROP INDEX CONCURRENTLY IF EXISTS ix_items_price;
+        """,
+    ], concurrent=True),
+]
+
+def _applied_versions(connection) -> set:
+    versions = set(connection.execute(text("SELECT version FROM schema_migrations")).scalars())
+    connection.commit()
+    return versions
+
+def _drop_invalid_index(connection, statement: str):
+    """
+    An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind, which
+    IF NOT EXISTS would then skip; drop it so the build is retried.
+    """
+    match = _INDEX_NAME.search(statement)
+    if not match:
+        return
+    invalid = connection.execute(text("""
+        SELECT 1 FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid
+        WHERE c.relname = :name AND NOT x.indisvalid
+    """), {"name": match.group(1)}).fetchone()
+    if invalid:
+        print(f"Dropping invalid index {match.group(1)} left by an interrupted build")
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}"))
+
+def _record(connection, migration: Migration):
+    connection.execute(
+        text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+        {"version": migration.version, "description": migration.description},
+    )
+
+def _apply(connection, migration: Migration):
+    if not migration.concurrent:
+        with connection.begin():
+            for statement in migration.statements:
+                connection.execute(text(statement))
+            _record(connection, migration)
+        return
+
+    connection.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        for statement in migration.statements:
+            _drop_invalid_index(connection, statement)
+            connection.execute(text(statement))
+        _record(connection, migration)
+    finally:
+        # Only ends SQLAlchemy's autobegun Transaction; every statement above already committed
+        connection.rollback()
+        connection.execution_options(isolation_level=connection.default_isolation_level)
+
+def migrate(engine):
+    """
+    Apply pending migrations in version order.
+    """
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
+        try:
+            connection.execute(text(CREATE_VERSION_TABLE))
+            connection.commit()
+            applied = _applied_versions(connection)
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                print(f"Applying migration {migration.version}: {migration.description}")
+                _apply(connection, migration)
+        finally:
+            connection.rollback()
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            connection.commit()
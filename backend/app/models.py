@@ -1,3 +1,15 @@
+# Rebuilds the conversations summary from messages; a no-op once the table has rows
+BACKFILL_CONVERSATIONS = """
+    INSERT INTO conversations (user_id, other_user_id, last_message_id, last_sender_id, last_item_id, last_content, last_sent_at, unread_count)
+    SELECT DISTINCT ON (p.user_id, p.other_user_id)
+        p.user_id, p.other_user_id, m.message_id, m.sender_id, m.item_id, m.content, COALESCE(m.sent_at, 'epoch'),
+        COUNT(*) FILTER (WHERE m.receiver_id = p.user_id AND m.sender_id <> p.user_id AND m.is_read IS NOT TRUE)
+            OVER (PARTITION BY p.user_id, p.other_user_id)
+    FROM messages m
+    CROSS JOIN LATERAL (VALUES (m.sender_id, m.receiver_id), (m.receiver_id, m.sender_id)) AS p(user_id, other_user_id)
+    WHERE NOT EXISTS (SELECT 1 FROM conversations)
+    ORDER BY p.user_id, p.other_user_id, m.sent_at DESC NULLS LAST, m.message_id DESC;
+    """
 
 CREATE_TABLE_STATEMENTS = [
     """
@@ -130,5 +142,42 @@ CREATE_TABLE_STATEMENTS = [
     """,
     """
     CREATE INDEX IF NOT EXISTS ix_messages_sent_at ON messages (sent_at);
+    """,
     """
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    """,
+    """
+    ALTER TABLE items ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))
+        ) STORED;
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_items_search_vector ON items USING GIN (search_vector);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_items_title_trgm ON items USING GIN (title gin_trgm_ops);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_items_description_trgm ON items USING GIN (description gin_trgm_ops);
+    """,
+    # Per-user inbox summary: one row per (user, other user), maintained by send_message
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        user_id INTEGER NOT NULL REFERENCES users(user_id),
+        other_user_id INTEGER NOT NULL REFERENCES users(user_id),
+        last_message_id INTEGER NOT NULL,
+        last_sender_id INTEGER NOT NULL,
+        last_item_id INTEGER REFERENCES items(item_id) ON DELETE SET NULL,
+        last_content TEXT NOT NULL,
+        last_sent_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        unread_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, other_user_id)
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_conversations_user_recent ON conversations (user_id, last_sent_at DESC);
+    """,
+    # Backfill from existing messages; only runs while the table is still empty
+    BACKFILL_CONVERSATIONS,
 ]
@@ -0,0 +1,88 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+
+from . import fulltext
+
+# Keyset sort definitions for the item listing:
+# sort name -> (key expression, direction, ItemResponse attribute)
+# item_id is always appended as the tiebreaker in the same direction,
+# so "next page" is a single row comparison against the last row seen.
+ITEM_SORTS = {
+    "post_date": ("i.post_date", "DESC", "post_date"),
+    "price_asc": ("COALESCE(i.price, 0)", "ASC", "price"),
+    "price_desc": ("COALESCE(i.price, 0)", "DESC", "price"),
+    # Only valid with a search term; the route selects the rank as sort_rank.
+    "relevance": (fulltext.SEARCH_RANK, "DESC", "sort_rank"),
+}
+DEFAULT_ITEM_SORT = "post_date"
+ITEM_PAGE_SIZE = 20
+# Messages returned per page of a conversation thread
+MESSAGE_PAGE_SIZE = 50
+
+def encode_cursor(value: Any, item_id: int) -> str:
+    """
+    Encode the sort key of the last row of a page into an opaque cursor.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, item_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, attr: str) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by encode_cursor, raising 400 if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, item_id = json.loads(raw)
+        if attr == "post_date":
+            value = datetime.fromisoformat(value)
+        elif attr == "sort_rank":
+            value = float(value)
+        else:
+            value = int(value)
+        return value, int(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def resolve_sort(sort: Optional[str], search: Optional[str]) -> str:
+    """
+    Map the requested sort to a key of ITEM_SORTS.
+    Searches default to relevance; relevance without a search term falls back to post_date.
+    """
+    if search and sort in (None, "", "relevance"):
+        return "relevance"
+    if sort in ITEM_SORTS and sort != "relevance":
+        return sort
+    return DEFAULT_ITEM_SORT
+
+def _sort_spec(sort: Optional[str]):
+    return ITEM_SORTS.get(sort or DEFAULT_ITEM_SORT, ITEM_SORTS[DEFAULT_ITEM_SORT])
+
+def keyset_clause(sort: Optional[str], cursor: Optional[str], params: dict) -> Tuple[str, str]:
+    """
+    Return (where, order_by) SQL fragments for a keyset page of items.
+    The WHERE fragment is empty when no cursor is given (first page).
+    """
+    key, direction, attr = _sort_spec(sort)
+    order_by = f"{key} {direction}, i.item_id {direction}"
+    where = ""
+    if cursor:
+        params["cursor_value"], params["cursor_id"] = decode_cursor(cursor, attr)
+        op = "<" if direction == "DESC" else ">"
+        where = f"({key}, i.item_id) {op} (:cursor_value, :cursor_id)"
+    return where, order_by
+
+def item_cursor(sort: Optional[str], item) -> str:
+    """
+    Build the cursor pointing just past the given item (or item row) under the given sort.
+    """
+    _, _, attr = _sort_spec(sort)
+    value = getattr(item, attr)
+    if attr == "price":
+        value = value or 0
+    return encode_cursor(value, item.item_id)
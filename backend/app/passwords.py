@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from fastapi import HTTPException, status
+import asyncio
+import multiprocessing
+import os
+
+# Argon2 cost parameters (argon2-cffi defaults). Changing them makes existing
+# hashes report check_needs_rehash, and they are upgraded on the next login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Hashing runs in its own process pool so a burst of logins cannot starve the event loop
+# or the threadpool. Requests beyond PASSWORD_QUEUE_LIMIT in flight are rejected with 503.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", str(PASSWORD_WORKERS * 8)))
+
+_hasher: Optional[PasswordHasher] = None
+_executor: Optional[ProcessPoolExecutor] = None
+_in_flight = 0
+
+def _get_hasher() -> PasswordHasher:
+    # one hasher per process
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(
+            time_cost=ARGON2_TIME_COST,
+            memory_cost=ARGON2_MEMORY_COST,
+            parallelism=ARGON2_PARALLELISM,
+        )
+    return _hasher
+
+def _hash(password: str) -> str:
+    return _get_hasher().hash(password)
+
+def _verify(password_hash: str, password: str) -> Tuple[bool, bool]:
+    ph = _get_hasher()
+    try:
+        ph.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False, False
+    return True, ph.check_needs_rehash(password_hash)
+
+def start():
+    """
+    Start the hashing pool. Called from the application lifespan.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _replace(broken: ProcessPoolExecutor):
+    """
+    A pool whose worker died (OOM kill, segfault) rejects all further work; start a new one.
+    Concurrent callers that saw the same broken pool replace it only once.
+    """
+    global _executor
+    if _executor is broken:
+        broken.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    start()
+
+async def _run(fn, *args):
+    global _in_flight
+    if _in_flight >= PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent password operations, please retry",
+            headers={"Retry-After": "1"},
+        )
+    start()
+    _in_flight += 1
+    loop = asyncio.get_running_loop()
+    try:
+        executor = _executor
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            _replace(executor)
+        # Retry once on the new pool
+        try:
+            return await loop.run_in_executor(_executor, fn, *args)
+        except BrokenProcessPool:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password hashing is temporarily unavailable, please retry",
+                headers={"Retry-After": "1"},
+            )
+    finally:
+        _in_flight -= 1
+
+async def hash_password(password: str) -> str:
+    """
+    Hash a password in the worker pool.
+    """
+    return await _run(_hash, password)
+
+async def verify_password(password_hash: str, password: str) -> Tuple[bool, bool]:
+    """
+    Verify a password in the worker pool.
+    Returns (matches, needs_rehash).
+    """
+    return await _run(_verify, password_hash, password)
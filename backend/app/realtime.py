@@ -0,0 +1,155 @@
+from collections import defaultdict
+from typing import Dict, Optional, Set
+from sqlalchemy import text
+import asyncio
+import json
+import os
+
+from . import database
+
+# Push channel for new chat messages.
+# REALTIME_BACKEND=memory (default) fans messages out to sockets connected to this process only;
+# REALTIME_BACKEND=postgres publishes through LISTEN/NOTIFY so every worker sees every message.
+REALTIME_BACKEND = os.getenv("REALTIME_BACKEND", "memory").lower()
+REALTIME_CHANNEL = os.getenv("REALTIME_CHANNEL", "dbp_messages")
+# Messages buffered per connection; a client that falls further behind loses the overflow
+# and should resync through GET /api/messages/{other_user_id}.
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "100"))
+REALTIME_RECONNECT_DELAY = float(os.getenv("REALTIME_RECONNECT_DELAY", "2"))
+
+# NOTIFY payloads are limited to 8000 bytes; longer messages are sent by id and re-read
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+if REALTIME_BACKEND not in ("memory", "postgres"):
+    raise ValueError("REALTIME_BACKEND must be 'memory' or 'postgres'")
+
+class MessageBroker:
+    """
+    In-process pub/sub of new messages, keyed by user id. Only touched from the event loop.
+    """
+    def __init__(self, backend: str):
+        self.backend = backend
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._listener = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=REALTIME_QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def _deliver(self, message: dict):
+        payload = None
+        # the sender gets it too, so their other tabs stay in sync
+        for user_id in {message["sender_id"], message["receiver_id"]}:
+            for queue in self._subscribers.get(user_id, ()):
+                if payload is None:
+                    payload = json.dumps(message)
+                try:
+                    queue.put_nowait(payload)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    self.dropped += 1
+
+    async def publish(self, message: dict):
+        """
+        Fan a committed message out to its sender and receiver. Call after commit.
+        """
+        self.published += 1
+        if self.backend == "memory":
+            self._deliver(message)
+            return
+
+        payload = json.dumps(message)
+        if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+            payload = json.dumps({key: message[key] for key in ("message_id", "sender_id", "receiver_id")})
+        async with database.async_engine.begin() as conn:
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": REALTIME_CHANNEL, "payload": payload})
+
+    async def _load_message(self, message_id: int) -> Optional[dict]:
+        async with database.AsyncSessionLocal() as db:
+            row = (await db.execute(text("""
+                SELECT message_id, sender_id, receiver_id, content, sent_at, is_read, item_id
+                FROM messages WHERE message_id = :message_id
+            """), {"message_id": message_id})).fetchone()
+        return dict(row._mapping) if row else None
+
+    async def _on_notify_async(self, message: dict):
+        if "content" not in message:
+            message = await self._load_message(message["message_id"])
+            if message is None:
+                return
+            message["sent_at"] = message["sent_at"].isoformat()
+        self._deliver(message)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        message = json.loads(payload)
+        # every worker receives every notification; only work for users connected here
+        if message["sender_id"] not in self._subscribers and message["receiver_id"] not in self._subscribers:
+            return
+        if "content" in message:
+            self._deliver(message)
+        else:
+            asyncio.get_running_loop().create_task(self._on_notify_async(message))
+
+    def _on_connection_lost(self, connection):
+        self._listener = None
+        if not self._closing:
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        import asyncpg
+
+        while not self._closing:
+            try:
+                # a dedicated connection outside the pool: LISTEN holds it for the process lifetime
+                conn = await asyncpg.connect(database.DATABASE_URL)
+                await conn.add_listener(REALTIME_CHANNEL, self._on_notify)
+                conn.add_termination_listener(self._on_connection_lost)
+                self._listener = conn
+                return
+            except (OSError, asyncpg.PostgresError) as e:
+                print(f"Realtime listener could not connect, retrying: {e}")
+                await asyncio.sleep(REALTIME_RECONNECT_DELAY)
+
+    async def start(self):
+        """
+        Start listening for notifications. Called from the application lifespan.
+        """
+        if self.backend == "postgres" and self._listener is None:
+            self._closing = False
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def shutdown(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            await listener.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "listening": self._listener is not None if self.backend == "postgres" else None,
+            "users": len(self._subscribers),
+            "connections": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+broker = MessageBroker(REALTIME_BACKEND)
@@ -1,21 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form, File, UploadFile
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Form, File, UploadFile, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
-from argon2 import PasswordHasher
-from datetime import datetime
-import uuid
-import os
+from typing import List, Literal, Optional, Union
+import asyncio
+import orjson
 
-from . import models, schemas
-from .database import get_db
-from .auth import authenticate_user, get_token, verify_token
+from . import models, schemas, hydration, pagination, fulltext, uploads, thumbnails, passwords, cache, realtime, bulk, facets, categories
+from .cache import response_cache
+from .database import get_async_db
+from .auth import authenticate_user, get_token, verify_token, revoke_token, require_admin
 
 router = APIRouter()
-UPLOAD_DIRECTORY = "./uploads"
-os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+
+# 多筆電話 / 圖片以陣列參數一次寫入, 來回次數不隨筆數增加
+INSERT_PHONES = text("""
+    INSERT INTO phones (user_id, phone_number)
+    SELECT :user_id, phone_number FROM unnest(CAST(:phones AS varchar[])) WITH ORDINALITY AS p(phone_number, position)
+    ORDER BY position
+""")
 
 """
 -----------------------------
@@ -24,9 +28,8 @@ os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
 """
 
 @router.post("/users/", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.createUser, db: Session = Depends(get_db)):
-    ph = PasswordHasher()
-    password_hash = ph.hash(user.password)
+async def create_user(user: schemas.createUser, db: AsyncSession = Depends(get_async_db)):
+    password_hash = await passwords.hash_password(user.password)
     
     try:
         query = text("""
@@ -35,7 +38,7 @@ def create_user(user: schemas.createUser, db: Session = Depends(get_db)):
             RETURNING user_id
         """)
         
-        result = db.execute(query, {
+        result = await db.execute(query, {
             "username": user.username,
             "email": user.email,
             "password_hash": password_hash,
@@ -45,17 +48,14 @@ def create_user(user: schemas.createUser, db: Session = Depends(get_db)):
         row = result.fetchone()
         new_user_id = row.user_id
 
+        # 所有電話以單一 INSERT ... SELECT unnest 寫入
         if user.phones:
-            for p in user.phones:
-                db.execute(
-                    text("INSERT INTO phones (user_id, phone_number) VALUES (:user_id, :phone_number)"), 
-                    {"user_id": new_user_id, "phone_number": p}
-                )
+            await db.execute(INSERT_PHONES, {"user_id": new_user_id, "phones": list(user.phones)})
         
-        db.commit()
+        await db.commit()
         
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         
         error_detail = str(e.orig)
         message = "Data integrity error"
@@ -70,39 +70,33 @@ def create_user(user: schemas.createUser, db: Session = Depends(get_db)):
             detail=message
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
         )
 
-    return read_user(new_user_id, db)
+    return await read_user(new_user_id, db)
 
 @router.get("/users/me", response_model=schemas.UserResponse)
-def read_current_user(db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
-    return read_user(user_id, db)
-
-@router.get("/users/me/items", response_model=List[schemas.ItemResponse])
-def read_my_items(db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
-    items = db.execute(text("SELECT * FROM items WHERE owner_id = :user_id ORDER BY post_date DESC"), {"user_id": user_id}).fetchall()
-    result = []
-    for i in items:
-        imgs = db.execute(text("SELECT image_data_name FROM item_images WHERE item_id = :item_id"), 
-                          {"item_id": i.item_id}).fetchall()
-        result.append(schemas.ItemResponse(
-            item_id=i.item_id, title=i.title, description=i.description,
-            condition=i.condition, owner_id=i.owner_id, post_date=i.post_date,
-            price=i.price, exchange_type=i.exchange_type, status=i.status,
-            desired_item=i.desired_item, total_images=i.total_images,
-            category=i.category, images=[img.image_data_name for img in imgs]
-        ))
-    return result
+async def read_current_user(db: AsyncSession = Depends(get_async_db), user_id: int = Depends(verify_token)):
+    return await read_user(user_id, db)
+
+@router.get("/users/me/items", response_model=List[Union[schemas.ItemResponse, schemas.ItemSummary]])
+async def read_my_items(
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(verify_token),
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None
+):
+    item_fields = hydration.resolve_fields(view, fields)
+    return ORJSONResponse(await hydration.query_items(db, where="i.owner_id = :user_id", order_by="i.post_date DESC", params={"user_id": user_id}, fields=item_fields))
 
 @router.get("/users/{user_id}", response_model=schemas.UserResponse)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.execute(text("SELECT * FROM users WHERE user_id = :user_id"), {"user_id": user_id}).fetchone()
+async def read_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(text("SELECT * FROM users WHERE user_id = :user_id"), {"user_id": user_id})).fetchone()
     if not db_user: raise HTTPException(status_code=404, detail="User not found")
-    phones = db.execute(text("SELECT phone_number FROM phones WHERE user_id = :user_id"), {"user_id": user_id}).fetchall()
+    phones = (await db.execute(text("SELECT phone_number FROM phones WHERE user_id = :user_id"), {"user_id": user_id})).fetchall()
     return schemas.UserResponse(
         user_id=db_user.user_id, username=db_user.username, email=db_user.email,
         is_active=db_user.is_active, join_date=db_user.join_date,
@@ -110,12 +104,17 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
     )
 
 @router.post("/login", response_model=schemas.Token)
-def login(user_login: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(user_login.username, user_login.password, db)
+async def login(user_login: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(user_login.username, user_login.password, db)
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     return {"access_token": get_token(user.user_id), "token_type": "bearer"}
 
+@router.post("/logout")
+async def logout(token: str):
+    revoke_token(token)
+    return {"message": "Logged out"}
+
 """
 -----------------------------
         Item Routes
@@ -123,7 +122,7 @@ def login(user_login: schemas.UserLogin, db: Session = Depends(get_db)):
 """
 
 @router.post("/items/", response_model=schemas.ItemResponse, status_code=status.HTTP_201_CREATED)
-def create_item(
+async def create_item(
     title: str = Form(...),
     description: Optional[str] = Form(None),
     condition: str = Form(...),
@@ -132,119 +131,156 @@ def create_item(
     desired_item: Optional[str] = Form(None),
     category: int = Form(...),
     images: Optional[List[UploadFile]] = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # 配合 auth.py，從 Query 參數接收 token 並得到 user_id (int)
     user_id: int = Depends(verify_token) 
 ):
     if not user_id: raise HTTPException(status_code=401, detail="Invalid token")
 
-    # 解決 ForeignKeyViolation：自動建立分類 
-    if not db.execute(text("SELECT 1 FROM categories WHERE category_id = :category"), {"category": category}).fetchone():
-        db.execute(text("INSERT INTO categories (category_id, category_name) VALUES (:category, :name)"), 
-                   {"category": category, "name": f"Category {category}"})
-        db.commit()
+    # 解決 ForeignKeyViolation：未知分類自動建立 (與商品同一交易); 已知分類由快取判斷, 不查資料庫
+    await categories.catalogue.ensure(db, category)
 
+    # 以固定大小區塊串流寫入磁碟，並限制單檔與整體大小
     img_paths = []
+    saved_names = []
     if images:
-        for img in images:
-            if not img.filename: continue
-            file_ext = img.filename.split(".")[-1]
-            unique_name = f"{uuid.uuid4()}.{file_ext}"
-            save_path = os.path.join(UPLOAD_DIRECTORY, unique_name)
-            with open(save_path, "wb") as buffer:
-                # 解決 500 UnicodeDecodeError：讀取二進位數據
-                buffer.write(img.file.read()) 
-            img_paths.append(f"/api/images/{unique_name}")
-
-    # Insert Item
+        saved_names = await uploads.save_images(images)
+        img_paths = [f"/api/images/{name}" for name in saved_names]
+
+    # Insert Item 與所有圖片: 同一個陳述式 (data-modifying CTE)
     query = text("""
-        INSERT INTO items (title, description, condition, owner_id, price, exchange_type, status, desired_item, category, total_images, post_date)
-        VALUES (:title, :description, :condition, :owner_id, :price, :exchange_type, true, :desired_item, :category, :total_images, now())
-        RETURNING item_id, post_date
+        WITH new_item AS (
+            INSERT INTO items (title, description, condition, owner_id, price, exchange_type, status, desired_item, category, total_images, post_date)
+            VALUES (:title, :description, :condition, :owner_id, :price, :exchange_type, true, :desired_item, :category, :total_images, now())
+            RETURNING item_id, title, description, condition, owner_id, post_date, price,
+                      exchange_type, status, desired_item, category, total_images
+        ), new_images AS (
+            INSERT INTO item_images (item_id, image_data_name)
+            SELECT new_item.item_id, img.path
+            FROM new_item, unnest(CAST(:paths AS varchar[])) WITH ORDINALITY AS img(path, position)
+            ORDER BY img.position
+        )
+        SELECT * FROM new_item
     """)
-    result = db.execute(query, {
+    result = (await db.execute(query, {
         "title": title, "description": description, "condition": condition,
         "owner_id": user_id, "price": price, "exchange_type": exchange_type,
-        "desired_item": desired_item, "category": category, "total_images": len(img_paths)
-    }).fetchone()
-    
-    new_item_id = result.item_id
-    post_date = result.post_date
-    
-    # Insert Images
-    for path in img_paths:
-        db.execute(text("INSERT INTO item_images (item_id, image_data_name) VALUES (:item_id, :path)"), 
-                   {"item_id": new_item_id, "path": path})
+        "desired_item": desired_item, "category": category, "total_images": len(img_paths),
+        "paths": img_paths
+    })).fetchone()
     
-    db.commit()
+    await db.commit()
+    await response_cache.invalidate(*cache.ITEM_LISTING_KEYS)
+
+    # 縮圖 (thumb/card/full) 交由 process pool 在背景產生
+    thumbnails.schedule(uploads.UPLOAD_DIRECTORY, saved_names)
     
-    return schemas.ItemResponse(
-        item_id=new_item_id, title=title, description=description,
-        condition=condition, owner_id=user_id, post_date=post_date,
-        price=price, exchange_type=exchange_type, status=True,
-        desired_item=desired_item, total_images=len(img_paths),
-        category=category, images=img_paths
-    )
+    return ORJSONResponse(hydration.item_dict(result, images=img_paths), status_code=status.HTTP_201_CREATED)
 
-@router.get("/items/", response_model=List[schemas.ItemResponse])
-def read_items(
-    db: Session = Depends(get_db), 
+@router.get("/items/", response_model=schemas.ItemPage)
+async def read_items(
+    db: AsyncSession = Depends(get_async_db), 
     search: Optional[str] = None, 
-    sort: Optional[str] = None
+    sort: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    category: Optional[List[int]] = Query(None),
+    condition: Optional[List[str]] = Query(None),
+    min_price: Optional[int] = Query(None, ge=0),
+    max_price: Optional[int] = Query(None, ge=0),
+    exchange_type: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.ITEM_PAGE_SIZE, ge=1, le=100),
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None
 ):
-    # 基礎 SQL 語句
-    sql_str = "SELECT * FROM items WHERE status = true"
+    # 預設首頁 (無搜尋、無篩選、預設排序，full 或 summary) 走 response cache
+    sort_key = pagination.resolve_sort(sort, search)
+    item_fields = hydration.resolve_fields(view, fields)
     params = {}
-
-    # 實作 Search/Filter 功能 (使用 LIKE 進行模糊搜尋)
+    filter_where = facets.filter_clause(params, category, condition, min_price, max_price, exchange_type)
+    is_default_page = not search and owner_id is None and not filter_where and cursor is None and not fields \
+        and limit == pagination.ITEM_PAGE_SIZE and sort_key == pagination.DEFAULT_ITEM_SORT
+    listing_key = cache.ITEM_LISTING_SUMMARY_KEY if view == "summary" else cache.ITEM_LISTING_KEY
+    if is_default_page and (body := await response_cache.get(listing_key)) is not None:
+        return Response(content=body, media_type="application/json")
+
+    # 基礎條件 + 篩選 (category / condition / 價格區間 / exchange_type)
+    where = "i.status = true"
+    if filter_where:
+        where += f" AND {filter_where}"
+
+    if owner_id is not None:
+        where += " AND i.owner_id = :owner_id"
+        params["owner_id"] = owner_id
+
+    # 實作 Search 功能 (tsvector 全文檢索 + pg_trgm 子字串比對，皆有 GIN 索引)
     if search:
-        sql_str += " AND (title LIKE :search OR description LIKE :search)"
-        params["search"] = f"%{search}%"
-
-    # 實作 Sort 功能
-    if sort == "price_asc":
-        sql_str += " ORDER BY price ASC"
-    elif sort == "price_desc":
-        sql_str += " ORDER BY price DESC"
-    else:
-        # 預設按日期排序 (最新上架)
-        sql_str += " ORDER BY post_date DESC"
-
-    # 執行原生 SQL
-    items = db.execute(text(sql_str), params).fetchall()
-    
-    result = []
-    for i in items:
-        # 取得圖片的 SQL 保持不變
-        imgs = db.execute(text("SELECT image_data_name FROM item_images WHERE item_id = :item_id"), 
-                          {"item_id": i.item_id}).fetchall()
-        result.append(schemas.ItemResponse(
-            item_id=i.item_id, title=i.title, description=i.description,
-            condition=i.condition, owner_id=i.owner_id, post_date=i.post_date,
-            price=i.price, exchange_type=i.exchange_type, status=i.status,
-            desired_item=i.desired_item, total_images=i.total_images,
-            category=i.category, images=[img.image_data_name for img in imgs]
-        ))
-    return result
+        where += f" AND {fulltext.SEARCH_CONDITION}"
+        params.update(fulltext.search_params(search))
+
+    # 第一頁附上整個結果集的 facet 計數 (單一 GROUPING SETS 聚合)
+    item_facets = None
+    if cursor is None:
+        item_facets = await facets.facet_counts(db, where, params)
+
+    # 實作 Sort 與 keyset 分頁 (relevance / post_date / price_asc / price_desc，以 item_id 為 tiebreaker)
+    keyset_where, order_by = pagination.keyset_clause(sort_key, cursor, params)
+    if keyset_where:
+        where += f" AND {keyset_where}"
+    extra_columns = f"{fulltext.SEARCH_RANK} AS sort_rank" if sort_key == "relevance" else ""
+
+    # 精簡欄位時仍需選出 cursor 用的排序欄位 (post_date / price)
+    sql_fields = item_fields and tuple(dict.fromkeys([*item_fields, "post_date", "price"]))
+
+    # 多取一筆以判斷是否還有下一頁
+    rows = await hydration.query_item_rows(db, where=where, order_by=order_by, params=params, limit=limit + 1, extra_columns=extra_columns, fields=sql_fields)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = pagination.item_cursor(sort_key, rows[-1])
+    page = {
+        "items": [hydration.item_dict(r, fields=item_fields) for r in rows],
+        "next_cursor": next_cursor,
+        "facets": item_facets.model_dump() if item_facets else None,
+    }
+    body = orjson.dumps(page)
+    if is_default_page:
+        await response_cache.set(listing_key, body)
+    return Response(content=body, media_type="application/json")
+
+@router.get("/categories/", response_model=List[schemas.CategoryResponse])
+async def list_categories(db: AsyncSession = Depends(get_async_db)):
+    # active_item_count 由 items 上的 trigger 增量維護, 不需 COUNT(*)
+    rows = (await db.execute(text("""
+        SELECT category_id, category_name, active_item_count FROM categories ORDER BY category_id
+    """))).fetchall()
+    return ORJSONResponse([
+        {"category_id": r.category_id, "category_name": r.category_name, "active_item_count": r.active_item_count}
+        for r in rows
+    ])
 
 @router.get("/items/{item_id}", response_model=schemas.ItemResponse)
-def read_item(item_id: int, db: Session = Depends(get_db)):
-    item = db.execute(text("SELECT * FROM items WHERE item_id = :item_id"), {"item_id": item_id}).fetchone()
-    if not item: raise HTTPException(status_code=404, detail="Item not found")
-    imgs = db.execute(text("SELECT image_data_name FROM item_images WHERE item_id = :item_id"), {"item_id": item_id}).fetchall()
-    return schemas.ItemResponse(
-        item_id=item.item_id, title=item.title, description=item.description,
-        condition=item.condition, owner_id=item.owner_id, post_date=item.post_date,
-        price=item.price, exchange_type=item.exchange_type, status=item.status,
-        desired_item=item.desired_item, total_images=item.total_images,
-        category=item.category, images=[img.image_data_name for img in imgs]
-    )
+async def read_item(item_id: int, db: AsyncSession = Depends(get_async_db)):
+    cache_key = cache.item_key(item_id)
+    body = await response_cache.get(cache_key)
+    if body is None:
+        item = (await hydration.load_items(db, [item_id])).get(item_id)
+        if not item: raise HTTPException(status_code=404, detail="Item not found")
+        body = orjson.dumps(item)
+        await response_cache.set(cache_key, body)
+    return Response(content=body, media_type="application/json")
 
 @router.get("/images/{filename}")
-def get_image(filename: str):
-    file_path = os.path.join(UPLOAD_DIRECTORY, filename)
-    if not os.path.exists(file_path): raise HTTPException(status_code=404)
-    return FileResponse(file_path)
+async def get_image(filename: str, request: Request, size: Optional[Literal["thumb", "card", "full"]] = None):
+    if size:
+        response = await uploads.image_response(request, thumbnails.variant_name(filename, size), media_type=thumbnails.VARIANT_MEDIA_TYPE)
+        if response: return response
+        # 縮圖尚未產生時回傳原圖，且不可長期快取
+        response = await uploads.image_response(request, filename, immutable=False)
+    else:
+        response = await uploads.image_response(request, filename)
+    if not response: raise HTTPException(status_code=404)
+    return response
 
 """
 -----------------------------
@@ -252,64 +288,46 @@ def get_image(filename: str):
 -----------------------------
 """
 @router.post("/wishlist/", response_model=schemas.WishlistResponse)
-def add_to_wishlist(wish_in: schemas.WishlistCreate, db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
-    # Insert Wishlist
-    if query := db.execute(text("SELECT 1 FROM wishlist WHERE user_id = :user_id AND item_id = :item_id"), {"user_id": user_id, "item_id": wish_in.item_id}).fetchone():
-        raise HTTPException(status_code=400, detail="Item already in wishlist")
+async def add_to_wishlist(wish_in: schemas.WishlistCreate, db: AsyncSession = Depends(get_async_db), user_id: int = Depends(verify_token)):
+    # Insert Wishlist (ux_wishlist_user_item 擋下重複收藏)
     query = text("""
         INSERT INTO wishlist (user_id, item_id, added_date)
         VALUES (:user_id, :item_id, now())
+        ON CONFLICT (user_id, item_id) DO NOTHING
         RETURNING added_date
     """)
-    result = db.execute(query, {"user_id": user_id, "item_id": wish_in.item_id}).fetchone()
+    result = (await db.execute(query, {"user_id": user_id, "item_id": wish_in.item_id})).fetchone()
+    if not result:
+        raise HTTPException(status_code=400, detail="Item already in wishlist")
     added_date = result.added_date
-    db.commit()
+    await db.commit()
     
     # Fetch Item
-    item_obj = db.execute(text("SELECT * FROM items WHERE item_id = :item_id"), {"item_id": wish_in.item_id}).fetchone()
-    item_response = None
-    if item_obj:
-        imgs = db.execute(text("SELECT image_data_name FROM item_images WHERE item_id = :item_id"), {"item_id": item_obj.item_id}).fetchall()
-        item_response = schemas.ItemResponse(
-            item_id=item_obj.item_id, title=item_obj.title, description=item_obj.description,
-            condition=item_obj.condition, owner_id=item_obj.owner_id, post_date=item_obj.post_date,
-            price=item_obj.price, exchange_type=item_obj.exchange_type, status=item_obj.status,
-            desired_item=item_obj.desired_item, total_images=item_obj.total_images,
-            category=item_obj.category, images=[img.image_data_name for img in imgs]
-        )
-
-    return schemas.WishlistResponse(
-        user_id=user_id,
-        item_id=wish_in.item_id,
-        added_date=added_date,
-        item=item_response
-    )
+    items = await hydration.load_items(db, [wish_in.item_id])
+    return ORJSONResponse({
+        "user_id": user_id,
+        "item_id": wish_in.item_id,
+        "added_date": added_date,
+        "item": items.get(wish_in.item_id),
+    })
 
 @router.get("/wishlist/", response_model=List[schemas.WishlistResponse])
-def get_wishlist(db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
-    wishlist_items = db.execute(text("SELECT * FROM wishlist WHERE user_id = :user_id"), {"user_id": user_id}).fetchall()
-    result = []
-    for w in wishlist_items:
-        # Fetch Item
-        item_obj = db.execute(text("SELECT * FROM items WHERE item_id = :item_id"), {"item_id": w.item_id}).fetchone()
-        item_response = None
-        if item_obj:
-            imgs = db.execute(text("SELECT image_data_name FROM item_images WHERE item_id = :item_id"), {"item_id": item_obj.item_id}).fetchall()
-            item_response = schemas.ItemResponse(
-                item_id=item_obj.item_id, title=item_obj.title, description=item_obj.description,
-                condition=item_obj.condition, owner_id=item_obj.owner_id, post_date=item_obj.post_date,
-                price=item_obj.price, exchange_type=item_obj.exchange_type, status=item_obj.status,
-                desired_item=item_obj.desired_item, total_images=item_obj.total_images,
-                category=item_obj.category, images=[img.image_data_name for img in imgs]
-            )
-        
-        result.append(schemas.WishlistResponse(
-            user_id=w.user_id,
-            item_id=w.item_id,
-            added_date=w.added_date,
-            item=item_response
-        ))
-    return result
+async def get_wishlist(
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(verify_token),
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None
+):
+    item_fields = hydration.resolve_fields(view, fields)
+    wishlist_items = (await db.execute(text("SELECT user_id, item_id, added_date FROM wishlist WHERE user_id = :user_id"), {"user_id": user_id})).fetchall()
+    # Fetch all items in one query
+    items = await hydration.load_items(db, [w.item_id for w in wishlist_items], fields=item_fields)
+    return ORJSONResponse([{
+        "user_id": w.user_id,
+        "item_id": w.item_id,
+        "added_date": w.added_date,
+        "item": items.get(w.item_id),
+    } for w in wishlist_items])
 
 """
 -----------------------------
@@ -317,144 +335,130 @@ def get_wishlist(db: Session = Depends(get_db), user_id: int = Depends(verify_to
 -----------------------------
 """
 
-@router.post("/transactions/", response_model=schemas.TransactionResponse, status_code=status.HTTP_201_CREATED)
-def create_transaction(trans_in: schemas.TransactionCreate, db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
-    # Check if item exists and is available
-    item = db.execute(text("SELECT * FROM items WHERE item_id = :item_id"), {"item_id": trans_in.item_id}).fetchone()
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not item.status:
-        raise HTTPException(status_code=400, detail="Item is not available")
-    if item.owner_id == user_id:
-        raise HTTPException(status_code=400, detail="Cannot buy your own item")
+def transaction_dict(t, item: Optional[dict]) -> dict:
+    # TransactionResponse 形狀的 dict，直接交給 orjson 序列化
+    return {
+        "transaction_id": t.transaction_id,
+        "item_id": t.item_id,
+        "buyer_id": t.buyer_id,
+        "seller_id": t.seller_id,
+        "transaction_date": t.transaction_date,
+        "status": t.status,
+        "completion_date": t.completion_date,
+        "item": item,
+    }
 
-    # Create transaction
+@router.post("/transactions/", response_model=schemas.TransactionResponse, status_code=status.HTTP_201_CREATED)
+async def create_transaction(trans_in: schemas.TransactionCreate, db: AsyncSession = Depends(get_async_db), user_id: int = Depends(verify_token)):
+    # 單一語句建立交易：FOR SHARE 鎖住商品列，與完成交易 (UPDATE items) 互斥，
+    # 等待後會以最新版本重新檢查 status，已售出的商品不會再產生 pending 交易。
+    # 同一買家對同一商品只能有一筆 pending (ux_transactions_pending_item_buyer)
     query = text("""
         INSERT INTO transactions (item_id, buyer_id, seller_id, transaction_date, status)
-        VALUES (:item_id, :buyer_id, :seller_id, now(), 'pending')
-        RETURNING transaction_id, transaction_date
+        SELECT i.item_id, :buyer_id, i.owner_id, now(), 'pending'
+        FROM items i
+        WHERE i.item_id = :item_id AND i.status = true AND i.owner_id <> :buyer_id
+        FOR SHARE OF i
+        ON CONFLICT (item_id, buyer_id) WHERE status = 'pending' DO NOTHING
+        RETURNING transaction_id, item_id, buyer_id, seller_id, transaction_date, status, completion_date
     """)
-    result = db.execute(query, {
-        "item_id": trans_in.item_id,
-        "buyer_id": user_id,
-        "seller_id": item.owner_id
-    }).fetchone()
-    
-    db.commit()
-    
-    # Fetch item details for response
-    imgs = db.execute(text("SELECT image_data_name FROM item_images WHERE item_id = :item_id"), {"item_id": item.item_id}).fetchall()
-    item_response = schemas.ItemResponse(
-        item_id=item.item_id, title=item.title, description=item.description,
-        condition=item.condition, owner_id=item.owner_id, post_date=item.post_date,
-        price=item.price, exchange_type=item.exchange_type, status=item.status,
-        desired_item=item.desired_item, total_images=item.total_images,
-        category=item.category, images=[img.image_data_name for img in imgs]
-    )
+    created = (await db.execute(query, {"item_id": trans_in.item_id, "buyer_id": user_id})).fetchone()
+    await db.commit()
+
+    if not created:
+        # 失敗時才查詢原因
+        item = (await db.execute(text("SELECT status, owner_id FROM items WHERE item_id = :item_id"), {"item_id": trans_in.item_id})).fetchone()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        if not item.status:
+            raise HTTPException(status_code=400, detail="Item is not available")
+        if item.owner_id == user_id:
+            raise HTTPException(status_code=400, detail="Cannot buy your own item")
+        raise HTTPException(status_code=409, detail="You already have a pending transaction for this item")
 
-    return schemas.TransactionResponse(
-        transaction_id=result.transaction_id,
-        item_id=trans_in.item_id,
-        buyer_id=user_id,
-        seller_id=item.owner_id,
-        transaction_date=result.transaction_date,
-        status="pending",
-        completion_date=None,
-        item=item_response
-    )
+    # Fetch item details for response
+    items = await hydration.load_items(db, [created.item_id])
+    return ORJSONResponse(transaction_dict(created, items.get(created.item_id)), status_code=status.HTTP_201_CREATED)
 
 @router.get("/transactions/", response_model=List[schemas.TransactionResponse])
-def get_transactions(db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
+async def get_transactions(
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(verify_token),
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None
+):
+    item_fields = hydration.resolve_fields(view, fields)
     # Get transactions where user is buyer or seller
     query = text("""
-        SELECT * FROM transactions 
+        SELECT transaction_id, item_id, buyer_id, seller_id, transaction_date, status, completion_date
+        FROM transactions
         WHERE buyer_id = :user_id OR seller_id = :user_id
         ORDER BY transaction_date DESC
     """)
-    transactions = db.execute(query, {"user_id": user_id}).fetchall()
-    
-    result = []
-    for t in transactions:
-        # Fetch Item
-        item_obj = db.execute(text("SELECT * FROM items WHERE item_id = :item_id"), {"item_id": t.item_id}).fetchone()
-        item_response = None
-        if item_obj:
-            imgs = db.execute(text("SELECT image_data_name FROM item_images WHERE item_id = :item_id"), {"item_id": item_obj.item_id}).fetchall()
-            item_response = schemas.ItemResponse(
-                item_id=item_obj.item_id, title=item_obj.title, description=item_obj.description,
-                condition=item_obj.condition, owner_id=item_obj.owner_id, post_date=item_obj.post_date,
-                price=item_obj.price, exchange_type=item_obj.exchange_type, status=item_obj.status,
-                desired_item=item_obj.desired_item, total_images=item_obj.total_images,
-                category=item_obj.category, images=[img.image_data_name for img in imgs]
-            )
-            
-        result.append(schemas.TransactionResponse(
-            transaction_id=t.transaction_id,
-            item_id=t.item_id,
-            buyer_id=t.buyer_id,
-            seller_id=t.seller_id,
-            transaction_date=t.transaction_date,
-            status=t.status,
-            completion_date=t.completion_date,
-            item=item_response
-        ))
-    return result
+    transactions = (await db.execute(query, {"user_id": user_id})).fetchall()
+    # Fetch all items in one query
+    items = await hydration.load_items(db, [t.item_id for t in transactions], fields=item_fields)
+    return ORJSONResponse([transaction_dict(t, items.get(t.item_id)) for t in transactions])
 
 @router.put("/transactions/{transaction_id}", response_model=schemas.TransactionResponse)
-def update_transaction(transaction_id: int, trans_update: schemas.TransactionUpdate, db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
-    # Get transaction
-    trans = db.execute(text("SELECT * FROM transactions WHERE transaction_id = :tid"), {"tid": transaction_id}).fetchone()
-    if not trans:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-        
-    # Only buyer or seller can update? Or maybe specific rules.
-    # For simplicity, let's say seller can complete or cancel, buyer can cancel.
-    if user_id != trans.buyer_id and user_id != trans.seller_id:
-        raise HTTPException(status_code=403, detail="Not authorized")
-        
-    # Update status
-    completion_date = None
+async def update_transaction(transaction_id: int, trans_update: schemas.TransactionUpdate, db: AsyncSession = Depends(get_async_db), user_id: int = Depends(verify_token)):
+    # 狀態機：只有 pending → completed / cancelled，買家或賣家皆可操作。
+    # 每個轉換都是帶 WHERE status = 'pending' 的條件式 UPDATE，並發時只有一個會成功。
+    params = {"tid": transaction_id, "user_id": user_id}
     if trans_update.status == "completed":
-        completion_date = datetime.now()
-        # Also mark item as sold
-        db.execute(text("UPDATE items SET status = false WHERE item_id = :item_id"), {"item_id": trans.item_id})
-        
-    query = text("""
-        UPDATE transactions 
-        SET status = :status, completion_date = :cdate
-        WHERE transaction_id = :tid
-        RETURNING *
-    """)
-    updated_trans = db.execute(query, {
-        "status": trans_update.status,
-        "cdate": completion_date,
-        "tid": transaction_id
-    }).fetchone()
-    db.commit()
-    
-    # Fetch Item
-    item_obj = db.execute(text("SELECT * FROM items WHERE item_id = :item_id"), {"item_id": updated_trans.item_id}).fetchone()
-    item_response = None
-    if item_obj:
-        imgs = db.execute(text("SELECT image_data_name FROM item_images WHERE item_id = :item_id"), {"item_id": item_obj.item_id}).fetchall()
-        item_response = schemas.ItemResponse(
-            item_id=item_obj.item_id, title=item_obj.title, description=item_obj.description,
-            condition=item_obj.condition, owner_id=item_obj.owner_id, post_date=item_obj.post_date,
-            price=item_obj.price, exchange_type=item_obj.exchange_type, status=item_obj.status,
-            desired_item=item_obj.desired_item, total_images=item_obj.total_images,
-            category=item_obj.category, images=[img.image_data_name for img in imgs]
-        )
+        # 先把商品標為售出 (鎖住商品列)，商品仍在架上才完成交易；
+        # 同一商品的兩筆交易同時完成時，後到者重新檢查 items.status 後不會更新任何列
+        query = text("""
+            WITH sold AS (
+                UPDATE items SET status = false
+                WHERE status = true AND item_id = (
+                    SELECT item_id FROM transactions
+                    WHERE transaction_id = :tid AND status = 'pending'
+                      AND :user_id IN (buyer_id, seller_id)
+                )
+                RETURNING item_id
+            )
+            UPDATE transactions t SET status = 'completed', completion_date = now()
+            FROM sold
+            WHERE t.transaction_id = :tid AND t.item_id = sold.item_id AND t.status = 'pending'
+            RETURNING t.transaction_id, t.item_id, t.buyer_id, t.seller_id, t.transaction_date, t.status, t.completion_date
+        """)
+    else:
+        query = text("""
+            UPDATE transactions SET status = 'cancelled'
+            WHERE transaction_id = :tid AND status = 'pending' AND :user_id IN (buyer_id, seller_id)
+            RETURNING transaction_id, item_id, buyer_id, seller_id, transaction_date, status, completion_date
+        """)
+    updated_trans = (await db.execute(query, params)).fetchone()
+
+    if updated_trans and trans_update.status == "completed":
+        # 取消同商品其他 pending 交易。需另一個語句 (新 snapshot) 才看得到在上面取得商品鎖前剛提交的交易；
+        # 之後的新交易會被商品鎖擋住，提交後看到已售出而不會建立
+        await db.execute(text("""
+            UPDATE transactions SET status = 'cancelled'
+            WHERE item_id = :item_id AND status = 'pending' AND transaction_id <> :tid
+        """), {"item_id": updated_trans.item_id, "tid": transaction_id})
+
+    if not updated_trans:
+        # 交易在取得鎖前已被取消時，sold CTE 仍可能已下架商品；整筆回滾
+        await db.rollback()
+        trans = (await db.execute(text("SELECT buyer_id, seller_id, status FROM transactions WHERE transaction_id = :tid"), {"tid": transaction_id})).fetchone()
+        if not trans:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        if user_id != trans.buyer_id and user_id != trans.seller_id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        if trans.status != "pending":
+            raise HTTPException(status_code=409, detail=f"Transaction is already {trans.status}")
+        raise HTTPException(status_code=409, detail="Item is no longer available")
+    await db.commit()
 
-    return schemas.TransactionResponse(
-        transaction_id=updated_trans.transaction_id,
-        item_id=updated_trans.item_id,
-        buyer_id=updated_trans.buyer_id,
-        seller_id=updated_trans.seller_id,
-        transaction_date=updated_trans.transaction_date,
-        status=updated_trans.status,
-        completion_date=updated_trans.completion_date,
-        item=item_response
-    )
+    if trans_update.status == "completed":
+        # 商品已售出，從快取移除
+        await response_cache.invalidate(*cache.item_keys(updated_trans.item_id))
+
+    # Fetch Item
+    items = await hydration.load_items(db, [updated_trans.item_id])
+    return ORJSONResponse(transaction_dict(updated_trans, items.get(updated_trans.item_id)))
 
 """
 -----------------------------
@@ -463,26 +467,46 @@ def update_transaction(transaction_id: int, trans_update: schemas.TransactionUpd
 """
 
 @router.post("/messages/", response_model=schemas.MessageResponse, status_code=status.HTTP_201_CREATED)
-def send_message(msg_in: schemas.MessageCreate, db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
+async def send_message(msg_in: schemas.MessageCreate, db: AsyncSession = Depends(get_async_db), user_id: int = Depends(verify_token)):
     # Check if receiver exists
-    receiver = db.execute(text("SELECT 1 FROM users WHERE user_id = :uid"), {"uid": msg_in.receiver_id}).fetchone()
+    receiver = (await db.execute(text("SELECT 1 FROM users WHERE user_id = :uid"), {"uid": msg_in.receiver_id})).fetchone()
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver not found")
         
+    # 新增訊息並同時更新雙方的對話摘要 (收件者未讀數 +1)
     query = text("""
-        INSERT INTO messages (sender_id, receiver_id, content, sent_at, item_id)
-        VALUES (:sender_id, :receiver_id, :content, now(), :item_id)
-        RETURNING message_id, sent_at
+        WITH m AS (
+            INSERT INTO messages (sender_id, receiver_id, content, sent_at, item_id)
+            VALUES (:sender_id, :receiver_id, :content, now(), :item_id)
+            RETURNING message_id, sender_id, receiver_id, content, sent_at, item_id
+        ), summary AS (
+            INSERT INTO conversations AS c (user_id, other_user_id, last_message_id, last_sender_id, last_item_id, last_content, last_sent_at, unread_count)
+            SELECT p.user_id, p.other_user_id, m.message_id, m.sender_id, m.item_id, m.content, m.sent_at, p.unread
+            FROM m
+            CROSS JOIN LATERAL (VALUES (m.sender_id, m.receiver_id, 0), (m.receiver_id, m.sender_id, 1)) AS p(user_id, other_user_id, unread)
+            WHERE p.user_id <> p.other_user_id OR p.unread = 0
+            -- 固定鎖定順序：A→B 與 B→A 同時送出時不會互相死結
+            ORDER BY p.user_id, p.other_user_id
+            ON CONFLICT (user_id, other_user_id) DO UPDATE SET
+                -- 並行寫入時只保留較新的訊息
+                last_message_id = GREATEST(c.last_message_id, EXCLUDED.last_message_id),
+                last_sender_id = CASE WHEN EXCLUDED.last_message_id > c.last_message_id THEN EXCLUDED.last_sender_id ELSE c.last_sender_id END,
+                last_item_id = CASE WHEN EXCLUDED.last_message_id > c.last_message_id THEN EXCLUDED.last_item_id ELSE c.last_item_id END,
+                last_content = CASE WHEN EXCLUDED.last_message_id > c.last_message_id THEN EXCLUDED.last_content ELSE c.last_content END,
+                last_sent_at = GREATEST(c.last_sent_at, EXCLUDED.last_sent_at),
+                unread_count = c.unread_count + EXCLUDED.unread_count
+        )
+        SELECT message_id, sent_at FROM m
     """)
-    result = db.execute(query, {
+    result = (await db.execute(query, {
         "sender_id": user_id,
         "receiver_id": msg_in.receiver_id,
         "content": msg_in.content,
         "item_id": msg_in.item_id
-    }).fetchone()
-    db.commit()
+    })).fetchone()
+    await db.commit()
     
-    return schemas.MessageResponse(
+    message = schemas.MessageResponse(
         message_id=result.message_id,
         sender_id=user_id,
         receiver_id=msg_in.receiver_id,
@@ -491,53 +515,133 @@ def send_message(msg_in: schemas.MessageCreate, db: Session = Depends(get_db), u
         is_read=False,
         item_id=msg_in.item_id
     )
+    # 推送給已連線的收件者 (及寄件者的其他分頁)
+    await realtime.broker.publish(message.model_dump(mode="json"))
+    return message
+
+@router.websocket("/ws/messages")
+async def message_stream(websocket: WebSocket, token: str):
+    # 瀏覽器無法在 WebSocket 設定 header, token 由 query string 帶入
+    user_id = await verify_token(token)
+    if not user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    queue = realtime.broker.subscribe(user_id)
+
+    async def pump():
+        while True:
+            await websocket.send_text(await queue.get())
+
+    sender = asyncio.create_task(pump())
+    try:
+        # 讀取直到客戶端斷線, 閒置連線不會佔用資料庫
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        realtime.broker.unsubscribe(user_id, queue)
 
 @router.get("/messages/{other_user_id}", response_model=List[schemas.MessageResponse])
-def get_messages(other_user_id: int, db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
-    # Get messages between current user and other_user
-    query = text("""
-        SELECT * FROM messages 
-        WHERE (sender_id = :user_id AND receiver_id = :other_id) 
-           OR (sender_id = :other_id AND receiver_id = :user_id)
-        ORDER BY sent_at ASC
+async def get_messages(
+    other_user_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(pagination.MESSAGE_PAGE_SIZE, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(verify_token)
+):
+    # Get messages between current user and other_user, oldest first.
+    # 預設回傳最新一頁; after_id 取得之後的新訊息, before_id 取得更早的一頁
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+
+    # 雙方向的訊息共用同一段索引範圍 (ix_messages_pair_sent_at)
+    where = """
+        LEAST(sender_id, receiver_id) = :low_id
+        AND GREATEST(sender_id, receiver_id) = :high_id
+    """
+    params = {"low_id": min(user_id, other_user_id), "high_id": max(user_id, other_user_id), "limit": limit}
+    if after_id is not None:
+        where += " AND (sent_at, message_id) > (SELECT sent_at, message_id FROM messages WHERE message_id = :after_id)"
+        params["after_id"] = after_id
+        order = "ASC"
+    else:
+        if before_id is not None:
+            where += " AND (sent_at, message_id) < (SELECT sent_at, message_id FROM messages WHERE message_id = :before_id)"
+            params["before_id"] = before_id
+        order = "DESC"
+
+    query = text(f"""
+        SELECT * FROM messages
+        WHERE {where}
+        ORDER BY sent_at {order}, message_id {order}
+        LIMIT :limit
     """)
-    messages = db.execute(query, {"user_id": user_id, "other_id": other_user_id}).fetchall()
+    messages = (await db.execute(query, params)).fetchall()
+    if order == "DESC":
+        messages.reverse()
+
+    # 開啟對話即視為已讀：清除未讀數並標記訊息
+    await db.execute(text("""
+        WITH c AS (
+            UPDATE conversations SET unread_count = 0
+            WHERE user_id = :user_id AND other_user_id = :other_id AND unread_count > 0
+            RETURNING 1
+        )
+        UPDATE messages SET is_read = true
+        WHERE EXISTS (SELECT 1 FROM c)
+          AND sender_id = :other_id AND receiver_id = :user_id AND is_read IS NOT TRUE
+    """), {"user_id": user_id, "other_id": other_user_id})
+    await db.commit()
     
-    return [schemas.MessageResponse(
-        message_id=m.message_id,
-        sender_id=m.sender_id,
-        receiver_id=m.receiver_id,
-        content=m.content,
-        sent_at=m.sent_at,
-        is_read=m.is_read if m.is_read is not None else False,
-        item_id=m.item_id
-    ) for m in messages]
-
-@router.get("/conversations/", response_model=List[schemas.UserResponse])
+    return ORJSONResponse([{
+        "message_id": m.message_id,
+        "sender_id": m.sender_id,
+        "receiver_id": m.receiver_id,
+        "content": m.content,
+        "sent_at": m.sent_at,
+        "is_read": m.is_read if m.is_read is not None else False,
+        "item_id": m.item_id,
+    } for m in messages])
+
 @router.get("/conversations/", response_model=List[schemas.ConversationResponse])
-def get_conversations(db: Session = Depends(get_db), user_id: int = Depends(verify_token)):
-    # 修正 SQL：選取對話對象，並關聯該對話最後涉及的商品資訊
+async def get_conversations(db: AsyncSession = Depends(get_async_db), user_id: int = Depends(verify_token)):
+    # 由對話摘要表依最近訊息排序, 一次索引查詢 (ix_conversations_user_recent)
     query = text("""
-        SELECT DISTINCT ON (u.user_id)
-            u.user_id, u.username, 
-            i.item_id, i.title as item_title,
-            img.image_data_name as item_image
-        FROM users u
-        JOIN messages m ON (u.user_id = m.sender_id OR u.user_id = m.receiver_id)
-        LEFT JOIN items i ON m.item_id = i.item_id
-        LEFT JOIN item_images img ON i.item_id = img.item_id
-        WHERE (m.sender_id = :user_id OR m.receiver_id = :user_id)
-          AND u.user_id != :user_id
+        SELECT
+            c.other_user_id AS user_id, u.username,
+            c.last_item_id AS item_id, i.title AS item_title, img.image_data_name AS item_image,
+            c.last_message_id, c.last_sender_id, c.last_content, c.last_sent_at, c.unread_count
+        FROM conversations c
+        JOIN users u ON u.user_id = c.other_user_id
+        LEFT JOIN items i ON i.item_id = c.last_item_id
+        LEFT JOIN LATERAL (
+            SELECT image_data_name FROM item_images
+            WHERE item_id = c.last_item_id
+            ORDER BY image_id
+            LIMIT 1
+        ) img ON true
+        WHERE c.user_id = :user_id
+        ORDER BY c.last_sent_at DESC
     """)
-    rows = db.execute(query, {"user_id": user_id}).fetchall()
+    rows = (await db.execute(query, {"user_id": user_id})).fetchall()
     
-    return [schemas.ConversationResponse(
-        user_id=r.user_id, 
-        username=r.username,
-        item_id=r.item_id,
-        item_title=r.item_title,
-        item_image=r.item_image
-    ) for r in rows]
+    return ORJSONResponse([{
+        "user_id": r.user_id,
+        "username": r.username,
+        "item_id": r.item_id,
+        "item_title": r.item_title,
+        "item_image": r.item_image,
+        "last_message_id": r.last_message_id,
+        "last_sender_id": r.last_sender_id,
+        "last_message": r.last_content,
+        "last_sent_at": r.last_sent_at,
+        "unread_count": r.unread_count,
+    } for r in rows])
 
 """
 -----------------------------
@@ -546,15 +650,15 @@ def get_conversations(db: Session = Depends(get_db), user_id: int = Depends(veri
 """
 
 @router.put("/items/{item_id}")
-def update_item(
+async def update_item(
     item_id: int, 
     item_update: schemas.ItemUpdate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_async_db), 
     user_id: int = Depends(verify_token)
 ):
     # 1. 權限檢查：使用原生 SQL 確認商品是否存在且屬於目前使用者
     check_query = text("SELECT owner_id FROM items WHERE item_id = :item_id")
-    item = db.execute(check_query, {"item_id": item_id}).fetchone()
+    item = (await db.execute(check_query, {"item_id": item_id})).fetchone()
     
     if not item:
         raise HTTPException(status_code=404, detail="找不到該商品")
@@ -573,7 +677,7 @@ def update_item(
         WHERE item_id = :item_id
     """)
     
-    db.execute(update_query, {
+    await db.execute(update_query, {
         "title": item_update.title,
         "description": item_update.description,
         "condition": item_update.condition,
@@ -582,20 +686,21 @@ def update_item(
         "desired_item": item_update.desired_item,
         "item_id": item_id
     })
-    db.commit()
+    await db.commit()
+    await response_cache.invalidate(*cache.item_keys(item_id))
     
     return {"message": "商品資訊已成功更新"}
 
 
 @router.delete("/items/{item_id}")
-def delete_item(
+async def delete_item(
     item_id: int, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_async_db), 
     user_id: int = Depends(verify_token)
 ):
     # 1. 權限檢查
     check_query = text("SELECT owner_id FROM items WHERE item_id = :item_id")
-    item = db.execute(check_query, {"item_id": item_id}).fetchone()
+    item = (await db.execute(check_query, {"item_id": item_id})).fetchone()
     
     if not item:
         raise HTTPException(status_code=404, detail="找不到該商品")
@@ -603,23 +708,24 @@ def delete_item(
         raise HTTPException(status_code=403, detail="您沒有權限刪除此商品")
 
     # 2. 執行刪除：先刪除關聯的圖片紀錄（避免外鍵衝突），再刪除商品本身
-    db.execute(text("DELETE FROM item_images WHERE item_id = :item_id"), {"item_id": item_id})
-    db.execute(text("DELETE FROM items WHERE item_id = :item_id"), {"item_id": item_id})
+    await db.execute(text("DELETE FROM item_images WHERE item_id = :item_id"), {"item_id": item_id})
+    await db.execute(text("DELETE FROM items WHERE item_id = :item_id"), {"item_id": item_id})
     
-    db.commit()
+    await db.commit()
+    await response_cache.invalidate(*cache.item_keys(item_id))
     return {"message": "商品已成功刪除"}
 
 # 在 routes.py 末尾新增交易刪除功能
 @router.delete("/transactions/{transaction_id}")
-def delete_transaction(
+async def delete_transaction(
     transaction_id: int, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_async_db), 
     user_id: int = Depends(verify_token)
 ):
     # 權限檢查：確保只有買家或賣家可以刪除（或僅限管理權限，依需求而定）
     # 使用原生 SQL 檢查
     check_sql = text("SELECT buyer_id, seller_id FROM transactions WHERE transaction_id = :tid")
-    trans = db.execute(check_sql, {"tid": transaction_id}).fetchone()
+    trans = (await db.execute(check_sql, {"tid": transaction_id})).fetchone()
     
     if not trans:
         raise HTTPException(status_code=404, detail="找不到交易紀錄")
@@ -627,33 +733,62 @@ def delete_transaction(
         raise HTTPException(status_code=403, detail="您沒有權限刪除此紀錄")
 
     # 執行刪除
-    db.execute(text("DELETE FROM transactions WHERE transaction_id = :tid"), {"tid": transaction_id})
-    db.commit()
+    await db.execute(text("DELETE FROM transactions WHERE transaction_id = :tid"), {"tid": transaction_id})
+    await db.commit()
     return {"message": "交易紀錄已刪除"}
 
 @router.post("/users/me", response_model=schemas.UserResponse)
-def update_current_user(
+async def update_current_user(
     email: Optional[str] = Form(None),
     address: Optional[str] = Form(None),
     phones: Optional[List[str]] = Form(None),
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_async_db), 
     user_id: int = Depends(verify_token) # 只需要這一個驗證
 ):
     # 確保 user_id 存在
     if not user_id:
         raise HTTPException(status_code=401, detail="驗證失敗")
 
-    if email:
-        db.execute(text("UPDATE users SET email = :email WHERE user_id = :id"), {"email": email, "id": user_id})  
-    if address:
-        db.execute(text("UPDATE users SET address = :address WHERE user_id = :id"), {"address": address, "id": user_id})
+    # 空字串視為未修改
+    if email or address:
+        await db.execute(text("""
+            UPDATE users
+            SET email = COALESCE(NULLIF(:email, ''), email),
+                address = COALESCE(NULLIF(:address, ''), address)
+            WHERE user_id = :id
+        """), {"email": email, "address": address, "id": user_id})
     
+    # 整批取代電話: 刪除舊資料與寫入新資料在同一個陳述式
     if phones is not None:
-        db.execute(text("DELETE FROM phones WHERE user_id = :id"), {"id": user_id})
-        for p in phones:
-            db.execute(text("INSERT INTO phones (user_id, phone_number) VALUES (:id, :num)"), 
-                       {"id": user_id, "num": p})
+        await db.execute(text(f"""
+            WITH removed AS (DELETE FROM phones WHERE user_id = :user_id)
+            {INSERT_PHONES.text}
+        """), {"user_id": user_id, "phones": list(phones)})
     
-    db.commit()
+    await db.commit()
     # 呼叫 read_user 取得最新資料回傳
-    return read_user(user_id, db)
+    return await read_user(user_id, db)
+
+"""
+-----------------------------
+        Admin Routes
+-----------------------------
+"""
+
+@router.get("/admin/items/export")
+async def export_items(admin_id: int = Depends(require_admin)):
+    # 以 COPY ... TO STDOUT 串流輸出, 欄位與 items 資料表相同
+    return StreamingResponse(
+        bulk.export_items(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="items.csv"'},
+    )
+
+@router.post("/admin/items/import", response_model=schemas.ImportReport)
+async def import_items(
+    file: UploadFile = File(...),
+    strict: bool = Query(False, description="Abort the whole import if any row is invalid."),
+    admin_id: int = Depends(require_admin)
+):
+    # 驗證後以 COPY FROM STDIN 載入暫存表, 再於單一交易中合併至 items / item_images
+    return await bulk.import_items(file, strict=strict)
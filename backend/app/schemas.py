@@ -1,6 +1,6 @@
 from fastapi import UploadFile
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 
 # Schemas for User operations
@@ -81,6 +81,78 @@ class ItemResponse(BaseModel):
     category: int
     images: Optional[List[str]] = Field(None, description="List of image paths for the item.")
 
+class ItemSummary(BaseModel):
+    """
+    Docstring for ItemSummary
+    """
+    item_id: int
+    title: str
+    price: Optional[int]
+    status: bool
+    owner_id: int
+    image: Optional[str] = Field(None, description="Path of the first image, if any.")
+
+class FacetCount(BaseModel):
+    """
+    Docstring for FacetCount
+    """
+    value: Union[bool, int, str]
+    label: Optional[str] = Field(None, description="Display name, e.g. the category name.")
+    count: int
+
+class PriceBucket(BaseModel):
+    """
+    Docstring for PriceBucket
+    """
+    min_price: int
+    max_price: Optional[int] = Field(None, description="Inclusive upper bound, null for the open-ended last bucket.")
+    count: int
+
+class ItemFacets(BaseModel):
+    """
+    Docstring for ItemFacets
+    """
+    total: int = Field(..., description="Number of items matching the current search and filters.")
+    category: List[FacetCount]
+    condition: List[FacetCount]
+    exchange_type: List[FacetCount]
+    price: List[PriceBucket]
+
+class ItemPage(BaseModel):
+    """
+    Docstring for ItemPage
+    """
+    items: List[Union[ItemResponse, ItemSummary]] = Field(..., description="Full items, or the summary / requested fields with view=summary or fields=.")
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page.")
+    facets: Optional[ItemFacets] = Field(None, description="Counts for the whole result set; only returned with the first page.")
+
+class ImportRowError(BaseModel):
+    """
+    Docstring for ImportRowError
+    """
+    row: int = Field(..., description="1-based data row in the uploaded CSV (the header is not counted).")
+    error: str
+
+class ImportReport(BaseModel):
+    """
+    Docstring for ImportReport
+    """
+    rows: int
+    inserted: int
+    updated: int
+    skipped: int
+    errors: List[ImportRowError]
+    errors_truncated: bool = False
+
+# Schemas for category operations
+class CategoryResponse(BaseModel):
+    """
+    Docstring for CategoryResponse
+    """
+    category_id: int
+    category_name: str
+    active_item_count: int = Field(..., description="Number of items in the category that are still for sale.")
+
 # Schemas for wishlist operations
 class WishlistCreate(BaseModel):
     """
@@ -95,7 +167,7 @@ class WishlistResponse(BaseModel):
     user_id: int
     item_id: int
     added_date: datetime
-    item: Optional[ItemResponse] = None
+    item: Optional[Union[ItemResponse, ItemSummary]] = None
 
 # Schemas for Transaction operations
 class TransactionCreate(BaseModel):
@@ -115,13 +187,13 @@ class TransactionResponse(BaseModel):
     transaction_date: datetime
     status: str
     completion_date: Optional[datetime]
-    item: Optional[ItemResponse] = None
+    item: Optional[Union[ItemResponse, ItemSummary]] = None
 
 class TransactionUpdate(BaseModel):
     """
     Docstring for TransactionUpdate
     """
-    status: str = Field(..., description="The new status of the transaction (e.g., completed, cancelled).")
+    status: Literal["completed", "cancelled"] = Field(..., description="The new status of a pending transaction.")
 
 # Schemas for Message operations
 class MessageCreate(BaseModel):
@@ -160,4 +232,9 @@ class ConversationResponse(BaseModel):
     username: str
     item_id: Optional[int] = None
     item_title: Optional[str] = None
-    item_image: Optional[str] = None
\ No newline at end of file
+    item_image: Optional[str] = None
+    last_message_id: Optional[int] = None
+    last_sender_id: Optional[int] = None
+    last_message: Optional[str] = None
+    last_sent_at: Optional[datetime] = None
+    unread_count: int = 0
\ No newline at end of file
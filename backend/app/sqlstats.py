@@ -0,0 +1,148 @@
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+import logging
+import os
+import random
+import re
+import time
+
+from . import database
+
+# Per-request SQL accounting, slow query log and N+1 detection.
+SQL_STATS = os.getenv("SQL_STATS", "true").lower() in ("1", "true", "yes")
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+# Fraction of slow SELECTs re-run under EXPLAIN (ANALYZE, BUFFERS); this executes them twice
+SQL_EXPLAIN_SAMPLE_RATE = float(os.getenv("SQL_EXPLAIN_SAMPLE_RATE", "0"))
+# The same statement run this many times in one request is reported as a likely N+1
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+SQL_SERVER_TIMING = os.getenv("SQL_SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("app.sql")
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+def fingerprint(statement: str) -> str:
+    """
+    Normalized statement text: whitespace collapsed and literals replaced by '?'.
+    Bind parameters are already placeholders, so one query shape maps to one fingerprint.
+    """
+    return _LITERALS.sub("?", _WHITESPACE.sub(" ", statement).strip())
+
+def _short(statement: str, length: int = 200) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    return statement if len(statement) <= length else statement[:length] + "..."
+
+class RequestSQLStats:
+    """
+    Queries executed while handling one request.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.slow = 0
+        self.fingerprints = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.seconds += elapsed
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD):
+        """
+        Statements run at least `threshold` times, most repeated first.
+        """
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+_current: ContextVar[Optional[RequestSQLStats]] = ContextVar("sql_stats", default=None)
+
+def current() -> Optional[RequestSQLStats]:
+    return _current.get()
+
+def _explain(conn, statement: str, parameters):
+    """
+    Re-run a slow SELECT under EXPLAIN (ANALYZE, BUFFERS) on its own cursor, inside a
+    savepoint so a failure cannot abort the caller's transaction.
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT sqlstats_explain")
+        try:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            cursor.execute("RELEASE SAVEPOINT sqlstats_explain")
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT sqlstats_explain")
+            raise
+        logger.warning("EXPLAIN (ANALYZE, BUFFERS) for slow query:\n%s", plan)
+    except Exception as e:
+        logger.warning("EXPLAIN of slow query failed: %s", e)
+    finally:
+        cursor.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._sqlstats_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._sqlstats_start
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+    if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+        if stats is not None:
+            stats.slow += 1
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, _short(statement, 1000))
+        if SQL_EXPLAIN_SAMPLE_RATE > 0 and not executemany and conn.in_transaction() \
+                and statement.lstrip().upper().startswith("SELECT") and random.random() < SQL_EXPLAIN_SAMPLE_RATE:
+            _explain(conn, statement, parameters)
+
+def instrument(engine):
+    """
+    Attach the timing hooks to a (sync) Engine.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+if SQL_STATS:
+    instrument(database.engine)
+    # AsyncEngine events are registered on its sync_engine; the hooks run inside the
+    # greenlet SQLAlchemy spawns per call, which carries the caller's contextvars.
+    instrument(database.async_engine.sync_engine)
+
+class SQLStatsMiddleware:
+    """
+    Collect SQL stats per request, report them in a Server-Timing header and
+    warn about statements repeated often enough to look like N+1 queries.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_STATS:
+            return await self.app(scope, receive, send)
+
+        stats = RequestSQLStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        async def timing_send(message):
+            if message["type"] == "http.response.start" and SQL_SERVER_TIMING:
+                total_ms = (time.perf_counter() - start) * 1000
+                header = (f'db;dur={stats.seconds * 1000:.1f};desc="{stats.queries} queries", '
+                          f'app;dur={total_ms:.1f}')
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timing_send)
+        finally:
+            _current.reset(token)
+            for statement, count in stats.repeated():
+                logger.warning(
+                    "Possible N+1: %s %s ran the same statement %d times (%d queries, %.1f ms total): %s",
+                    scope["method"], scope["path"], count, stats.queries, stats.seconds * 1000, _short(statement),
+                )
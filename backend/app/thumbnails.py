@@ -0,0 +1,106 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Optional
+import asyncio
+import functools
+import multiprocessing
+import os
+
+# Resized variants generated for every uploaded image: name -> longest edge in pixels.
+# Variants are written next to the original as "<uuid>_<variant>.<ext>".
+IMAGE_VARIANTS = {
+    "thumb": 160,
+    "card": 480,
+    "full": 1280,
+}
+IMAGE_VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "webp").lower()
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_VARIANT_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+_VARIANT_MEDIA_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+if IMAGE_VARIANT_FORMAT not in _VARIANT_EXTENSIONS:
+    raise ValueError("IMAGE_VARIANT_FORMAT must be 'webp' or 'jpeg'")
+
+VARIANT_MEDIA_TYPE = _VARIANT_MEDIA_TYPES[IMAGE_VARIANT_FORMAT]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = set()
+
+def variant_name(filename: str, variant: str) -> str:
+    """
+    File name of a variant of an uploaded image.
+    """
+    stem = filename.rsplit(".", 1)[0]
+    return f"{stem}_{variant}.{_VARIANT_EXTENSIONS[IMAGE_VARIANT_FORMAT]}"
+
+def render_variants(directory: str, filename: str):
+    """
+    Create every variant of one image. Runs inside a worker process.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(os.path.join(directory, filename)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        if IMAGE_VARIANT_FORMAT == "jpeg" and image.mode == "RGBA":
+            image = image.convert("RGB")
+
+        # Largest first, so each smaller variant is resized from an already reduced image
+        for variant, edge in sorted(IMAGE_VARIANTS.items(), key=lambda v: v[1], reverse=True):
+            image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            final_path = os.path.join(directory, variant_name(filename, variant))
+            tmp_path = f"{final_path}.part"
+            image.save(tmp_path, format=IMAGE_VARIANT_FORMAT.upper(), quality=IMAGE_VARIANT_QUALITY, optimize=True)
+            os.replace(tmp_path, final_path)
+
+def start():
+    """
+    Start the worker pool. Called from the application lifespan.
+    """
+    global _executor
+    if _executor is None:
+        # spawn: the workers must not inherit the event loop or open DB connections
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _replace(broken: ProcessPoolExecutor):
+    """
+    A pool whose worker died (OOM kill, crash on a bad image) rejects all further work;
+    start a new one. Jobs that were running in the broken pool are not retried.
+    """
+    global _executor
+    if _executor is broken:
+        broken.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    start()
+
+def _report(executor: ProcessPoolExecutor, future: asyncio.Future):
+    _pending.discard(future)
+    if not future.cancelled() and future.exception():
+        print(f"Image variant generation failed: {future.exception()}")
+        if isinstance(future.exception(), BrokenProcessPool):
+            _replace(executor)
+
+def schedule(directory: str, filenames: Iterable[str]):
+    """
+    Queue variant generation for freshly saved images without waiting for it.
+    Until a variant exists, get_image falls back to the original.
+    """
+    start()
+    loop = asyncio.get_running_loop()
+    for filename in filenames:
+        try:
+            future = loop.run_in_executor(_executor, render_variants, directory, filename)
+        except BrokenProcessPool:
+            _replace(_executor)
+            future = loop.run_in_executor(_executor, render_variants, directory, filename)
+        _pending.add(future)
+        future.add_done_callback(functools.partial(_report, _executor))
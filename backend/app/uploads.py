@@ -0,0 +1,182 @@
+from fastapi import HTTPException, Request, UploadFile, status
+from fastapi.responses import FileResponse, Response
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+import anyio
+import os
+import uuid
+
+UPLOAD_DIRECTORY = "./uploads"
+os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+
+# Uploads are copied in fixed-size chunks so memory per upload stays constant.
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+# Stored images are named by UUID and never overwritten, so clients may cache them forever.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Used when a resized variant is requested but not generated yet and the original is served instead.
+FALLBACK_CACHE_CONTROL = "public, max-age=60"
+# When set (e.g. "/protected-uploads/"), image bodies are handed to a fronting nginx via
+# X-Accel-Redirect so they are sent with sendfile() and never stream through Python.
+IMAGE_ACCEL_REDIRECT = os.getenv("IMAGE_ACCEL_REDIRECT", "")
+
+# content type -> file extension
+ALLOWED_IMAGE_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+def _sniff_image_type(head: bytes):
+    """
+    Detect the image type from its magic number, so the declared content type can be trusted.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    return None
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def _save_upload(img: UploadFile, request_budget: int) -> Tuple[str, int]:
+    """
+    Stream one upload to a temp file in UPLOAD_DIRECTORY and atomically rename it into place.
+    Returns (file name, bytes written).
+    """
+    ext = ALLOWED_IMAGE_TYPES.get(img.content_type)
+    if not ext:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"Unsupported image type: {img.content_type}")
+
+    unique_name = f"{uuid.uuid4()}.{ext}"
+    final_path = os.path.join(UPLOAD_DIRECTORY, unique_name)
+    tmp_path = f"{final_path}.part"
+    size = 0
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as buffer:
+            while chunk := await img.read(UPLOAD_CHUNK_SIZE):
+                if size == 0 and _sniff_image_type(chunk) != img.content_type:
+                    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"File content does not match {img.content_type}")
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+                if size > request_budget:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+                await buffer.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image file")
+        await anyio.to_thread.run_sync(os.replace, tmp_path, final_path)
+    except BaseException:
+        await anyio.to_thread.run_sync(_remove_quietly, tmp_path)
+        raise
+    return unique_name, size
+
+async def save_images(images: List[UploadFile]) -> List[str]:
+    """
+    Save every uploaded image, enforcing per-file and per-request size limits.
+    Returns the saved file names; on any failure, files already saved by this call are removed.
+    """
+    saved = []
+    budget = MAX_UPLOAD_BYTES
+    try:
+        for img in images:
+            if not img.filename: continue
+            name, size = await _save_upload(img, budget)
+            saved.append(name)
+            budget -= size
+    except BaseException:
+        for name in saved:
+            await anyio.to_thread.run_sync(_remove_quietly, os.path.join(UPLOAD_DIRECTORY, name))
+        raise
+    return saved
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+async def image_response(request: Request, filename: str, media_type: Optional[str] = None, immutable: bool = True) -> Optional[Response]:
+    """
+    Serve a stored image with caching headers, answering conditional requests with 304.
+    Returns None if the file does not exist.
+    """
+    path = os.path.join(UPLOAD_DIRECTORY, filename)
+    try:
+        # Every image request (304s included) stats the file; keep that off the event loop
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        return None
+
+    # Strong validator: the name is unique per upload and the content never changes
+    etag = f'"{filename.rsplit(".", 1)[0]}-{stat_result.st_size:x}"'
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else FALLBACK_CACHE_CONTROL,
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match is not None and _etag_matches(if_none_match, etag)) or \
+            (if_none_match is None and if_modified_since and _not_modified_since(if_modified_since, stat_result.st_mtime)):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if IMAGE_ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = f"{IMAGE_ACCEL_REDIRECT.rstrip('/')}/{filename}"
+        return Response(headers=headers, media_type=media_type)
+
+    # FileResponse handles Range / If-Range and uses the ASGI pathsend extension when the server offers it
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
+
+class UploadLimitMiddleware:
+    """
+    Reject request bodies larger than MAX_UPLOAD_BYTES while they stream in,
+    before the multipart parser spools them to disk.
+    """
+    def __init__(self, app, max_body_bytes: int = MAX_UPLOAD_BYTES + 1024 * 1024, path_limits: Optional[dict] = None):
+        # allow some headroom over MAX_UPLOAD_BYTES for multipart boundaries and form fields
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        # path -> body limit for routes that legitimately take larger bodies
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        max_body_bytes = self.path_limits.get(scope["path"], self.max_body_bytes)
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > max_body_bytes:
+                await send({"type": "http.response.start", "status": 413, "headers": [(b"content-type", b"application/json")]})
+                await send({"type": "http.response.body", "body": b'{"detail":"Request body too large"}'})
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,4 @@
+# Shared between the seeder and the load driver.
+# Every seeded user logs in as bench_user_<n> with BENCH_PASSWORD.
+BENCH_PASSWORD = "benchpass"
+USERNAME_PREFIX = "bench_user_"
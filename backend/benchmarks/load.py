@@ -0,0 +1,391 @@
+"""
+HTTP load driver for the API.
+
+Runs a weighted mix of requests against a running server with a fixed number of
+concurrent clients, then reports throughput and p50/p95/p99 latency per operation
+and saves the results as JSON. Expects data from benchmarks.seed.
+
+Every route in app/routes.py has an operation except /logout (it would revoke the
+tokens the workers share), the /ws/messages websocket (long-lived, not request/response)
+and the /admin import/export routes (bulk jobs, timed on their own). Writes that would
+wear down the seeded data only touch rows the driver created itself: transactions are
+completed only on driver-created items, and only driver-created items are deleted.
+
+    cd backend
+    uvicorn app.main:app --workers 4 &
+    python -m benchmarks.load --mix browse --concurrency 64 --duration 60
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Set, Tuple
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import uuid
+
+import httpx
+
+from .common import BENCH_PASSWORD, USERNAME_PREFIX
+
+SEARCH_TERMS = ["手機", "課本", "keyboard", "laptop", "椅子", "吉他", "camera", "外套"]
+SORTS = ["post_date", "price_asc", "price_desc"]
+IMAGE_SIZES = [None, "thumb", "card", "full"]
+
+# operation -> weight, per named mix
+MIXES = {
+    "browse": {
+        "list_items": 30, "list_items_next_page": 10, "search_items": 15, "sort_items": 8, "read_item": 25,
+        "image": 10, "read_user": 5, "my_items": 3, "categories": 3,
+    },
+    "chat": {
+        "conversations": 20, "get_messages": 40, "send_message": 30, "read_item": 10,
+    },
+    "write": {
+        "create_item": 10, "add_to_wishlist": 25, "create_transaction": 20, "send_message": 30, "update_item": 15,
+        "update_transaction": 10, "delete_transaction": 3, "delete_item": 3, "update_profile": 5, "register": 2,
+    },
+    "mixed": {
+        "list_items": 20, "list_items_next_page": 5, "search_items": 10, "sort_items": 5, "read_item": 15,
+        "image": 5, "read_user": 3, "my_items": 3, "wishlist": 5, "transactions": 4, "conversations": 5,
+        "get_messages": 7, "send_message": 5, "add_to_wishlist": 3, "create_transaction": 2, "create_item": 1,
+        "update_item": 1, "login": 1, "categories": 2, "update_transaction": 1, "delete_transaction": 1,
+        "delete_item": 1, "update_profile": 1, "register": 1,
+    },
+}
+
+def _tiny_png() -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 120, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class Session:
+    """
+    One logged-in benchmark user.
+    """
+    def __init__(self, user_id: int, username: str, token: str):
+        self.user_id = user_id
+        self.username = username
+        self.token = token
+        self.my_item_ids: List[int] = []
+
+class LoadDriver:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.sessions: List[Session] = []
+        self.item_ids: List[int] = []
+        self.image_paths: List[str] = []
+        self.cursors: List[str] = []
+        # Rows created during the run, so destructive operations stay off the seeded data
+        self.created_item_ids: List[int] = []
+        self.traded_item_ids: Set[int] = set()
+        self.pending: List[Tuple[int, int, Session]] = []  # (transaction_id, item_id, buyer)
+        self.png = _tiny_png()
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    async def setup(self):
+        """
+        Log in the benchmark users and sample ids to request, outside the measured window.
+        """
+        async def login(n: int):
+            username = f"{USERNAME_PREFIX}{n}"
+            response = await self.client.post("/api/login", json={"username": username, "password": BENCH_PASSWORD})
+            if response.status_code != 200:
+                return None
+            token = response.json()["access_token"]
+            me = await self.client.get("/api/users/me", params={"token": token})
+            return Session(me.json()["user_id"], username, token)
+
+        ids = self.rng.sample(range(1, self.args.seeded_users + 1), min(self.args.users, self.args.seeded_users))
+        self.sessions = [s for s in await asyncio.gather(*(login(n) for n in ids)) if s]
+        if not self.sessions:
+            raise SystemExit("No benchmark user could log in; run `python -m benchmarks.seed` first")
+
+        cursor = None
+        for _ in range(10):
+            params = {"limit": 100}
+            if cursor:
+                params["cursor"] = cursor
+            page = (await self.client.get("/api/items/", params=params)).json()
+            for item in page["items"]:
+                self.item_ids.append(item["item_id"])
+                self.image_paths.extend(item["images"])
+            if not page["next_cursor"]:
+                break
+            cursor = page["next_cursor"]
+            self.cursors.append(cursor)
+        if not self.item_ids:
+            raise SystemExit("No items found; run `python -m benchmarks.seed` first")
+
+    # -- operations -------------------------------------------------------------------
+
+    def _session(self) -> Session:
+        return self.rng.choice(self.sessions)
+
+    def _other_user_id(self, session: Session) -> int:
+        other = self._session()
+        return other.user_id if other is not session else self.sessions[0].user_id
+
+    async def op_list_items(self):
+        return await self.client.get("/api/items/")
+
+    async def op_list_items_next_page(self):
+        return await self.client.get("/api/items/", params={"cursor": self.rng.choice(self.cursors)} if self.cursors else {})
+
+    async def op_search_items(self):
+        return await self.client.get("/api/items/", params={"search": self.rng.choice(SEARCH_TERMS)})
+
+    async def op_sort_items(self):
+        return await self.client.get("/api/items/", params={"sort": self.rng.choice(SORTS)})
+
+    async def op_read_item(self):
+        return await self.client.get(f"/api/items/{self.rng.choice(self.item_ids)}")
+
+    async def op_image(self):
+        if not self.image_paths:
+            return await self.op_read_item()
+        size = self.rng.choice(IMAGE_SIZES)
+        return await self.client.get(self.rng.choice(self.image_paths), params={"size": size} if size else {})
+
+    async def op_categories(self):
+        return await self.client.get("/api/categories/")
+
+    async def op_read_user(self):
+        return await self.client.get(f"/api/users/{self._session().user_id}")
+
+    async def op_my_items(self):
+        return await self.client.get("/api/users/me/items", params={"token": self._session().token})
+
+    async def op_wishlist(self):
+        return await self.client.get("/api/wishlist/", params={"token": self._session().token})
+
+    async def op_transactions(self):
+        return await self.client.get("/api/transactions/", params={"token": self._session().token})
+
+    async def op_conversations(self):
+        return await self.client.get("/api/conversations/", params={"token": self._session().token})
+
+    async def op_get_messages(self):
+        session = self._session()
+        return await self.client.get(f"/api/messages/{self._other_user_id(session)}", params={"token": session.token})
+
+    async def op_send_message(self):
+        session = self._session()
+        return await self.client.post("/api/messages/", params={"token": session.token}, json={
+            "receiver_id": self._other_user_id(session),
+            "content": "benchmark message",
+            "item_id": self.rng.choice(self.item_ids),
+        })
+
+    async def op_add_to_wishlist(self):
+        # 400 "already in wishlist" is an expected outcome at scale
+        return await self.client.post("/api/wishlist/", params={"token": self._session().token},
+                                      json={"item_id": self.rng.choice(self.item_ids)})
+
+    async def op_create_transaction(self):
+        # Some requests go to driver-created items, the only ones update_transaction may sell
+        session = self._session()
+        if self.created_item_ids and self.rng.random() < 0.2:
+            item_id = self.rng.choice(self.created_item_ids)
+        else:
+            item_id = self.rng.choice(self.item_ids)
+        response = await self.client.post("/api/transactions/", params={"token": session.token}, json={"item_id": item_id})
+        if response.status_code == 201:
+            self.pending.append((response.json()["transaction_id"], item_id, session))
+            self.traded_item_ids.add(item_id)
+        return response
+
+    async def op_update_transaction(self):
+        if not self.pending:
+            return await self.op_create_transaction()
+        transaction_id, item_id, buyer = self.pending.pop(self.rng.randrange(len(self.pending)))
+        # 409 (a competing request already sold the item) is an expected outcome
+        status = "completed" if item_id in self.created_item_ids else "cancelled"
+        return await self.client.put(f"/api/transactions/{transaction_id}", params={"token": buyer.token},
+                                     json={"status": status})
+
+    async def op_delete_transaction(self):
+        if not self.pending:
+            return await self.op_create_transaction()
+        transaction_id, _, buyer = self.pending.pop(self.rng.randrange(len(self.pending)))
+        return await self.client.delete(f"/api/transactions/{transaction_id}", params={"token": buyer.token})
+
+    async def op_create_item(self):
+        session = self._session()
+        response = await self.client.post(
+            "/api/items/", params={"token": session.token},
+            data={"title": "benchmark item", "description": "created by benchmarks.load", "condition": "良好",
+                  "price": str(self.rng.randint(0, 5000)), "category": "1"},
+            files=[("images", ("bench.png", self.png, "image/png"))],
+        )
+        if response.status_code == 201:
+            session.my_item_ids.append(response.json()["item_id"])
+            self.created_item_ids.append(response.json()["item_id"])
+        return response
+
+    async def op_update_item(self):
+        session = self._session()
+        if not session.my_item_ids:
+            return await self.op_create_item()
+        item_id = self.rng.choice(session.my_item_ids)
+        return await self.client.put(f"/api/items/{item_id}", params={"token": session.token}, json={
+            "title": "benchmark item", "description": "updated by benchmarks.load", "condition": "良好",
+            "price": self.rng.randint(0, 5000), "exchange_type": False,
+        })
+
+    async def op_delete_item(self):
+        # Items with transactions are still referenced by them, so only untouched ones are deleted
+        session = self._session()
+        deletable = [i for i in session.my_item_ids if i not in self.traded_item_ids]
+        if not deletable:
+            return await self.op_create_item()
+        item_id = self.rng.choice(deletable)
+        session.my_item_ids.remove(item_id)
+        self.created_item_ids.remove(item_id)
+        return await self.client.delete(f"/api/items/{item_id}", params={"token": session.token})
+
+    async def op_update_profile(self):
+        session = self._session()
+        return await self.client.post("/api/users/me", params={"token": session.token}, data={
+            "address": f"台北市 {self.rng.randint(1, 300)} 號",
+            "phones": [f"09{self.rng.randint(0, 99999999):08d}" for _ in range(self.rng.randint(0, 3))],
+        })
+
+    async def op_register(self):
+        # argon2 hashing, like login; new users are not logged in or reused
+        name = f"load_{uuid.uuid4().hex[:16]}"
+        return await self.client.post("/api/users/", json={
+            "username": name, "email": f"{name}@bench.example.com", "password": BENCH_PASSWORD,
+            "phones": [f"09{self.rng.randint(0, 99999999):08d}" for _ in range(self.rng.randint(0, 2))],
+        })
+
+    async def op_login(self):
+        # argon2 verification: deliberately expensive
+        return await self.client.post("/api/login", json={"username": self._session().username, "password": BENCH_PASSWORD})
+
+    # -- driver -----------------------------------------------------------------------
+
+    def _record(self, name: str, elapsed: float, status_code: int):
+        self.latencies.setdefault(name, []).append(elapsed)
+        counts = self.statuses.setdefault(name, {})
+        counts[status_code] = counts.get(status_code, 0) + 1
+
+    async def _worker(self, operations, weights, deadline: float):
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(operations, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await getattr(self, f"op_{name}")()
+                status_code = response.status_code
+            except httpx.HTTPError:
+                status_code = 0
+            self._record(name, time.perf_counter() - started, status_code)
+
+    async def run(self, mix: Dict[str, int], concurrency: int, duration: float) -> float:
+        operations = list(mix)
+        weights = [mix[name] for name in operations]
+        if self.args.warmup > 0:
+            warmup_deadline = time.perf_counter() + self.args.warmup
+            await asyncio.gather(*(self._worker(operations, weights, warmup_deadline) for _ in range(concurrency)))
+            self.latencies.clear()
+            self.statuses.clear()
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(self._worker(operations, weights, deadline) for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def _summarize(samples: List[float], statuses: Dict[int, int], elapsed: float) -> dict:
+    ordered = sorted(samples)
+    errors = sum(count for code, count in statuses.items() if code == 0 or code >= 500)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def _print_report(report: dict):
+    print(f"\n{'operation':<24}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in list(report["operations"].items()) + [("TOTAL", report["total"])]:
+        print(f"{name:<24}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>10}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+async def main_async(args):
+    mix = MIXES[args.mix]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        driver = LoadDriver(client, args)
+        await driver.setup()
+        print(f"{len(driver.sessions)} users, {len(driver.item_ids)} sampled items; "
+              f"running mix '{args.mix}' with {args.concurrency} clients for {args.duration}s...")
+        elapsed = await driver.run(mix, args.concurrency, args.duration)
+
+    all_samples = [s for samples in driver.latencies.values() for s in samples]
+    all_statuses: Dict[int, int] = {}
+    for counts in driver.statuses.values():
+        for code, count in counts.items():
+            all_statuses[code] = all_statuses.get(code, 0) + count
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "host": platform.node(),
+        "url": args.url,
+        "mix": args.mix,
+        "weights": mix,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 3),
+        "seed": args.seed,
+        "operations": {name: _summarize(driver.latencies[name], driver.statuses[name], elapsed)
+                       for name in sorted(driver.latencies)},
+        "total": _summarize(all_samples, all_statuses, elapsed),
+    }
+    _print_report(report)
+
+    out = args.out or os.path.join("benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}-{args.mix}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nSaved {out}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    parser.add_argument("--users", type=int, default=50, help="benchmark users to log in")
+    parser.add_argument("--seeded-users", type=int, default=1000, help="--users value given to the seeder")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="result file (default benchmarks/results/<timestamp>-<mix>.json)")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
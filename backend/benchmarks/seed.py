@@ -0,0 +1,269 @@
+"""
+Deterministic benchmark data seeder.
+
+Creates the schema with database.init_db() and bulk-loads every table with COPY.
+The same --seed and volumes always produce the same rows, so runs are comparable.
+
+    cd backend
+    python -m benchmarks.seed --users 10000 --items 200000 --truncate
+"""
+from datetime import datetime, timedelta, timezone
+import argparse
+import io
+import os
+import random
+import time
+
+from app import database, models, passwords, uploads
+
+from .common import BENCH_PASSWORD, USERNAME_PREFIX
+
+PLACEHOLDER_IMAGES = 8
+CATEGORIES = ["書籍", "電子產品", "家具", "服飾", "運動用品", "生活用品", "文具", "樂器", "玩具", "其他"]
+CONDITIONS = ["全新", "近全新", "良好", "普通", "損壞"]
+WORDS = [
+    "二手", "手機", "耳機", "課本", "微積分", "線性代數", "椅子", "書桌", "檯燈", "外套", "球鞋", "吉他",
+    "keyboard", "mouse", "monitor", "laptop", "charger", "bicycle", "camera", "lamp", "backpack", "jacket",
+]
+# 2025-01-01, so post dates do not depend on when the seeder runs
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+class _CopyStream(io.TextIOBase):
+    """
+    File-like object over a row generator, so COPY pulls rows lazily in constant memory.
+    """
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += "\t".join(_copy_value(v) for v in row) + "\n"
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    readline = read
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def _copy(cursor, table: str, columns: tuple, rows) -> int:
+    counter = [0]
+
+    def counted():
+        for row in rows:
+            counter[0] += 1
+            yield row
+
+    started = time.perf_counter()
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", _CopyStream(counted()), size=1 << 16)
+    print(f"  {table:<14} {counter[0]:>10} rows  {time.perf_counter() - started:6.2f}s")
+    return counter[0]
+
+def _title(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+def _users(rng, count, password_hash):
+    for user_id in range(1, count + 1):
+        yield (user_id, f"{USERNAME_PREFIX}{user_id}", f"{USERNAME_PREFIX}{user_id}@bench.example.com", password_hash,
+               f"台北市 {rng.randint(1, 300)} 號", True, EPOCH + timedelta(minutes=user_id))
+
+def _phones(rng, users):
+    phone_id = 0
+    for user_id in range(1, users + 1):
+        for _ in range(rng.randint(0, 2)):
+            phone_id += 1
+            yield (phone_id, user_id, f"09{rng.randint(0, 99999999):08d}")
+
+def _items(rng, count, users):
+    for item_id in range(1, count + 1):
+        exchange = rng.random() < 0.2
+        yield (
+            item_id, _title(rng), " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))),
+            rng.choice(CONDITIONS), rng.randint(1, users), EPOCH + timedelta(seconds=rng.randint(0, 365 * 86400)),
+            rng.randint(0, 5000), exchange, rng.random() < 0.9, _title(rng) if exchange else None,
+            rng.randint(1, len(CATEGORIES)), None,
+        )
+
+def _images(rng, items, per_item):
+    image_id = 0
+    for item_id in range(1, items + 1):
+        for _ in range(rng.randint(0, per_item * 2)):
+            image_id += 1
+            # Same form as the paths create_item stores
+            yield (image_id, item_id, f"/api/images/bench_{image_id % PLACEHOLDER_IMAGES}.jpg")
+
+def _pairs(rng, count, left, right):
+    seen = set()
+    attempts = 0
+    while len(seen) < count and attempts < count * 10:
+        attempts += 1
+        pair = (rng.randint(1, left), rng.randint(1, right))
+        if pair in seen:
+            continue
+        seen.add(pair)
+        yield pair
+
+def _wishlist(rng, count, users, items):
+    for wishlist_id, (user_id, item_id) in enumerate(_pairs(rng, count, users, items), start=1):
+        yield (wishlist_id, user_id, item_id, EPOCH + timedelta(seconds=rng.randint(0, 365 * 86400)))
+
+def _transactions(rng, count, users, item_owners, item_active):
+    """
+    Transactions in states the API can reach: at most one completed per item (the caller
+    marks those items sold) with its other requests cancelled, no pending request on a sold
+    item, and at most one pending request per (item, buyer).
+    """
+    drawn = []
+    for transaction_id in range(1, count + 1):
+        item_id = rng.randint(1, len(item_owners))
+        seller_id = item_owners[item_id - 1]
+        buyer_id = rng.randint(1, users)
+        if buyer_id == seller_id:
+            buyer_id = buyer_id % users + 1
+        started = EPOCH + timedelta(seconds=rng.randint(0, 365 * 86400))
+        status = rng.choices(["pending", "completed", "cancelled"], weights=[5, 3, 2])[0]
+        drawn.append((transaction_id, item_id, buyer_id, seller_id, started, status, rng.randint(0, 14)))
+
+    # The first completed request per item is the sale
+    sales = {}
+    for transaction_id, item_id, *_, status, _days in drawn:
+        if status == "completed":
+            sales.setdefault(item_id, transaction_id)
+
+    pending = set()
+    for transaction_id, item_id, buyer_id, seller_id, started, status, days in drawn:
+        if status == "completed" and sales[item_id] != transaction_id:
+            status = "cancelled"
+        elif status == "pending" and (item_id in sales or not item_active[item_id - 1] or (item_id, buyer_id) in pending):
+            status = "cancelled"
+        if status == "pending":
+            pending.add((item_id, buyer_id))
+        yield (transaction_id, item_id, buyer_id, seller_id, started, status,
+               started + timedelta(days=days) if status == "completed" else None)
+
+def _messages(rng, count, users, items):
+    # Chat is concentrated: most messages belong to a limited set of long threads
+    threads = max(1, count // 40)
+    pairs = []
+    for _ in range(threads):
+        a = rng.randint(1, users)
+        b = rng.randint(1, users)
+        if a == b:
+            b = b % users + 1
+        pairs.append((a, b, rng.randint(1, items) if items else None))
+    sent_at = EPOCH
+    for message_id in range(1, count + 1):
+        a, b, item_id = rng.choice(pairs)
+        sender, receiver = (a, b) if rng.random() < 0.5 else (b, a)
+        sent_at += timedelta(seconds=rng.randint(1, 120))
+        yield (message_id, sender, receiver, " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12))),
+               sent_at, message_id < count * 0.95, item_id)
+
+def _write_placeholder_images():
+    from PIL import Image
+
+    for n in range(PLACEHOLDER_IMAGES):
+        path = os.path.join(uploads.UPLOAD_DIRECTORY, f"bench_{n}.jpg")
+        if not os.path.exists(path):
+            Image.new("RGB", (1200, 900), (40 * n % 256, 90, 160)).save(path, quality=85)
+
+def seed(args):
+    rng = random.Random(args.seed)
+    print("Initializing schema...")
+    database.init_db()
+
+    print("Hashing the shared benchmark password...")
+    password_hash = passwords._hash(BENCH_PASSWORD)
+    _write_placeholder_images()
+
+    connection = database.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if args.truncate:
+            cursor.execute("""
+                TRUNCATE conversations, messages, transactions, wishlist, item_images, items,
+                         categories, phones, users RESTART IDENTITY CASCADE
+            """)
+        started = time.perf_counter()
+        print("Loading:")
+        _copy(cursor, "users", ("user_id", "username", "email", "password_hash", "address", "is_active", "join_date"),
+              _users(rng, args.users, password_hash))
+        _copy(cursor, "phones", ("phone_id", "user_id", "phone_number"), _phones(rng, args.users))
+        _copy(cursor, "categories", ("category_id", "category_name"), ((n, name) for n, name in enumerate(CATEGORIES, start=1)))
+
+        # Owners and status are needed again for transactions; keep only those columns
+        item_owners = []
+        item_active = []
+
+        def items():
+            for row in _items(rng, args.items, args.users):
+                item_owners.append(row[4])
+                item_active.append(row[8])
+                yield row
+
+        _copy(cursor, "items", ("item_id", "title", "description", "condition", "owner_id", "post_date", "price",
+                                "exchange_type", "status", "desired_item", "category", "total_images"), items())
+        _copy(cursor, "item_images", ("image_id", "item_id", "image_data_name"), _images(rng, args.items, args.images_per_item))
+        cursor.execute("""
+            UPDATE items i SET total_images = img.n
+            FROM (SELECT item_id, count(*) AS n FROM item_images GROUP BY item_id) img
+            WHERE img.item_id = i.item_id
+        """)
+        cursor.execute("UPDATE items SET total_images = 0 WHERE total_images IS NULL")
+        _copy(cursor, "wishlist", ("wishlist_id", "user_id", "item_id", "added_date"),
+              _wishlist(rng, args.wishlists, args.users, args.items))
+        _copy(cursor, "transactions", ("transaction_id", "item_id", "buyer_id", "seller_id", "transaction_date", "status",
+                                       "completion_date"), _transactions(rng, args.transactions, args.users, item_owners, item_active))
+        cursor.execute("""
+            UPDATE items SET status = false
+            WHERE status AND item_id IN (SELECT item_id FROM transactions WHERE status = 'completed')
+        """)
+        _copy(cursor, "messages", ("message_id", "sender_id", "receiver_id", "content", "sent_at", "is_read", "item_id"),
+              _messages(rng, args.messages, args.users, args.items))
+        cursor.execute("DELETE FROM conversations")
+        cursor.execute(models.BACKFILL_CONVERSATIONS)
+
+        # Rows were loaded with explicit ids; move every sequence past them
+        for table, column in (("users", "user_id"), ("phones", "phone_id"), ("categories", "category_id"),
+                              ("items", "item_id"), ("item_images", "image_id"), ("wishlist", "wishlist_id"),
+                              ("transactions", "transaction_id"), ("messages", "message_id")):
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                           f"COALESCE((SELECT MAX({column}) FROM {table}), 0) + 1, false)")
+        connection.commit()
+        print(f"Loaded in {time.perf_counter() - started:.2f}s")
+
+        connection.set_isolation_level(0)
+        cursor.execute("VACUUM ANALYZE")
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--images-per-item", type=int, default=2, help="average images per item")
+    parser.add_argument("--wishlists", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="empty every table first (required on a non-empty database)")
+    seed(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
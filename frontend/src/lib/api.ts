@@ -4,17 +4,21 @@ import { PUBLIC_BACKEND_URL } from '$env/static/public';
 
 // 2. 將硬編碼網址替換為變數
 const BASE_URL = PUBLIC_BACKEND_URL;
-export const getFullImageUrl = (imagePath: string) => {
+// 與後端 MESSAGE_PAGE_SIZE 相同
+export const MESSAGE_PAGE_SIZE = 50;
+// size: 後端產生的縮圖尺寸 (thumb / card / full)，未指定時取得原圖
+export const getFullImageUrl = (imagePath: string, size: 'thumb' | 'card' | 'full' | null = null) => {
     if (!imagePath) return '';
 
     const ROOT_URL = PUBLIC_BACKEND_URL.replace(/\/api$/, '');
+    const query = size ? `?size=${size}` : '';
 
 
     if (imagePath.startsWith('/api')) {
-        return `${ROOT_URL}${imagePath}`;
+        return `${ROOT_URL}${imagePath}${query}`;
     }
 
-    return `${BASE_URL}${imagePath}`;
+    return `${BASE_URL}${imagePath}${query}`;
 };
 
 export const authApi = {
@@ -70,16 +74,47 @@ export const authApi = {
             throw new Error(msg || '帳號或密碼錯誤');
         }
         return response.json();
+    },
+
+    // 通知後端作廢 token；失敗時不影響本地登出
+    async logout() {
+        const token = localStorage.getItem('token');
+        if (!token || token === 'undefined') return;
+        try {
+            await fetch(`${BASE_URL}/logout?token=${token}`, { method: 'POST' });
+        } catch (error) {
+            console.warn('logout request failed', error);
+        }
     }
 };
 
+export interface ItemFilters {
+    category?: number[];
+    condition?: string[];
+    minPrice?: number | null;
+    maxPrice?: number | null;
+    exchangeType?: boolean | null;
+}
+
 export const itemApi = {
-    async getAll(search = '', sort = '') {
+    // 回傳 { items, next_cursor, facets }，將 next_cursor 帶入 cursor 取得下一頁；facets 只在第一頁回傳
+    // fields: 逗號分隔的欄位 (例如 'item_id,title,price,image')，只回傳列表需要的欄位
+    // view='summary': 卡片用的固定欄位 (item_id,title,price,status,owner_id,image)，預設首頁可命中後端快取
+    async getAll(search = '', sort = '', cursor: string | null = null, ownerId: number | null = null, filters: ItemFilters = {}, fields = '', view: 'full' | 'summary' = 'full') {
         const token = localStorage.getItem('token');
         // 構建 Query String
         const params = new URLSearchParams();
         if (search) params.append('search', search);
         if (sort) params.append('sort', sort);
+        if (cursor) params.append('cursor', cursor);
+        if (ownerId !== null) params.append('owner_id', ownerId.toString());
+        filters.category?.forEach((c) => params.append('category', c.toString()));
+        filters.condition?.forEach((c) => params.append('condition', c));
+        if (filters.minPrice != null) params.append('min_price', filters.minPrice.toString());
+        if (filters.maxPrice != null) params.append('max_price', filters.maxPrice.toString());
+        if (filters.exchangeType != null) params.append('exchange_type', filters.exchangeType.toString());
+        if (fields) params.append('fields', fields);
+        if (view !== 'full') params.append('view', view);
 
         const url = `${BASE_URL}/items/?${params.toString()}`;
 
@@ -124,9 +159,10 @@ export const itemApi = {
         return response.json();
     },
 
-    async getWishlist() {
+    async getWishlist(fields = '') {
         const token = localStorage.getItem('token');
-        const response = await fetch(`${BASE_URL}/wishlist/?token=${token}`);
+        const query = fields ? `&fields=${fields}` : '';
+        const response = await fetch(`${BASE_URL}/wishlist/?token=${token}${query}`);
         if (!response.ok) throw new Error('無法取得收藏清單');
         return response.json();
     },
@@ -152,6 +188,21 @@ export const itemApi = {
     }
 };
 
+export interface Category {
+    category_id: number;
+    category_name: string;
+    active_item_count: number;
+}
+
+export const categoryApi = {
+    // 分類清單與各分類上架中商品數
+    async getAll(): Promise<Category[]> {
+        const response = await fetch(`${BASE_URL}/categories/`);
+        if (!response.ok) throw new Error('獲取分類失敗');
+        return response.json();
+    }
+};
+
 export const userApi = {
     async getProfile() {
         const token = localStorage.getItem('token');
@@ -160,9 +211,10 @@ export const userApi = {
         return response.json();
     },
 
-    async getMyItems() {
+    async getMyItems(fields = '') {
         const token = localStorage.getItem('token');
-        const response = await fetch(`${BASE_URL}/users/me/items?token=${token}`);
+        const query = fields ? `&fields=${fields}` : '';
+        const response = await fetch(`${BASE_URL}/users/me/items?token=${token}${query}`);
         if (!response.ok) throw new Error('無法取得我的商品');
         return response.json();
     },
@@ -224,7 +276,11 @@ export const transactionApi = {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ status })
         });
-        if (!response.ok) throw new Error('更新狀態失敗');
+        if (!response.ok) {
+            // 409: 交易已非 pending，或商品已由其他交易售出
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || '更新狀態失敗');
+        }
         return response.json();
     },
 
@@ -251,9 +307,13 @@ export const messageApi = {
     },
 
     // 修正：增加 itemId 參數，並傳遞給後端
-    async getHistory(otherUserId: number, itemId: number) {
+    // 預設取得最新一頁；beforeId 取得更早的訊息，afterId 取得之後的新訊息
+    async getHistory(otherUserId: number, itemId: number, cursor: { beforeId?: number; afterId?: number } = {}) {
         const token = localStorage.getItem('token');
-        const response = await fetch(`${BASE_URL}/messages/${otherUserId}?token=${token}&item_id=${itemId}`);
+        const params = new URLSearchParams({ token: token || '', item_id: String(itemId) });
+        if (cursor.beforeId) params.append('before_id', String(cursor.beforeId));
+        if (cursor.afterId) params.append('after_id', String(cursor.afterId));
+        const response = await fetch(`${BASE_URL}/messages/${otherUserId}?${params.toString()}`);
         if (!response.ok) throw new Error('無法取得訊息紀錄');
         return response.json();
     },
@@ -263,5 +323,30 @@ export const messageApi = {
         const response = await fetch(`${BASE_URL}/conversations/?token=${token}`);
         if (!response.ok) throw new Error('無法取得對話列表');
         return response.json();
+    },
+
+    // 透過 WebSocket 接收新訊息，斷線時自動重連；回傳關閉連線的函式
+    subscribe(onMessage: (message: any) => void) {
+        const token = localStorage.getItem('token');
+        const url = `${BASE_URL.replace(/^http/, 'ws')}/ws/messages?token=${token}`;
+        let socket: WebSocket | null = null;
+        let closed = false;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
+
+        const connect = () => {
+            socket = new WebSocket(url);
+            socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+            socket.onclose = (event) => {
+                // 1008: token 無效，不再重試
+                if (!closed && event.code !== 1008) retryTimer = setTimeout(connect, 3000);
+            };
+        };
+        connect();
+
+        return () => {
+            closed = true;
+            clearTimeout(retryTimer);
+            socket?.close();
+        };
     }
 };